@@ -1,36 +1,171 @@
 import os
-from flask import Flask, render_template, request, send_file, redirect, url_for, session, flash
-from openai import OpenAI
-from fpdf import FPDF
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+from flask import Flask, render_template, request, send_file, redirect, url_for, session, flash, stream_with_context, g
 import json
-from datetime import datetime
-import numpy as np
+import csv
+import io
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
 from functools import wraps
+from contextlib import contextmanager
+import click
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+from markupsafe import Markup, escape
 import hashlib
+import base64
+import difflib
+import zlib
+import sqlite3
+import secrets
 import time
+import gzip
+import random
+import math
+import re
+import sys
+import threading
+import fcntl
+import asyncio
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from collections import Counter
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "tedx-speakerlab-secret-2024")
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+
+# openai, matplotlib, numpy si fpdf sunt importate la prima folosire, nu la
+# importul modulului: /login si celelalte rute simple nu platesc pentru ele.
+# Sub gunicorn, gunicorn.conf.py le preincarca o singura data in master.
+_client = None
+
+def get_client():
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    return _client
+
+def load_plotting():
+    """Returneaza (pyplot, numpy), cu backend-ul Agg setat."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import numpy as np
+    return plt, np
+
+def load_fpdf():
+    from fpdf import FPDF
+    return FPDF
+
+def preload_heavy_modules():
+    """Incarca modulele grele si cache-ul de fonturi matplotlib, pentru copy-on-write dupa fork."""
+    plt, np = load_plotting()
+    fig = plt.figure()
+    plt.close(fig)
+    load_fpdf()
+    import openai
+
+# Modul async (asgi.py, SPEAKERLAB_ASYNC=1): fiecare proces are un singur event loop, intr-un
+# thread dedicat, care detine clientul AsyncOpenAI si pool-ul lui de conexiuni. Thread-urile
+# care servesc cereri doar asteapta raspunsul modelului, deci un worker tine zeci de analize
+# in zbor. Scrierile de istoric merg intr-un singur thread (sunt serializate), iar PDF-urile
+# in procese separate: pyplot nu este thread-safe si randarea tine GIL-ul.
+ASYNC_MODE = os.environ.get("SPEAKERLAB_ASYNC") == "1"
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", 2))
+_async_loop = None
+_async_client = None
+_executors = {}
+_runtime_lock = threading.Lock()
+
+def get_async_loop():
+    global _async_loop
+    with _runtime_lock:
+        if _async_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="openai-loop", daemon=True).start()
+            _async_loop = loop
+    return _async_loop
+
+def run_async(coro):
+    """Ruleaza corutina pe loop-ul procesului si asteapta rezultatul in thread-ul curent."""
+    return asyncio.run_coroutine_threadsafe(coro, get_async_loop()).result()
+
+def get_async_client():
+    # Apelat doar din loop-ul dedicat, deci fara lock.
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+        _async_client = AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    return _async_client
+
+def preload_pdf_worker():
+    plt, np = load_plotting()
+    plt.close(plt.figure())
+    load_fpdf()
+
+def get_executor(kind):
+    with _runtime_lock:
+        if kind not in _executors:
+            if kind == "pdf":
+                _executors[kind] = ProcessPoolExecutor(
+                    PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=preload_pdf_worker)
+            else:
+                _executors[kind] = ThreadPoolExecutor(1, thread_name_prefix=kind)
+        return _executors[kind]
+
+def submit_blocking(kind, fn, *args):
+    """Pas blocant al unei analize ("history" sau "pdf"). In modul sync ruleaza pe loc."""
+    if ASYNC_MODE:
+        return get_executor(kind).submit(fn, *args)
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def start_async_runtime():
+    """Porneste loop-ul si incalzeste procesele de PDF, ca prima analiza sa nu astepte dupa ele."""
+    get_async_loop()
+    pool = get_executor("pdf")
+    for future in [pool.submit(preload_pdf_worker) for _ in range(PDF_WORKERS)]:
+        future.result()
 
 TIERS = {
-    "free":   {"name": "Explorer",  "color": "#6b7280", "analyses_per_day": 3},
-    "paid1":  {"name": "Speaker",   "color": "#b45309", "analyses_per_day": 20},
-    "paid2":  {"name": "Coach",     "color": "#1d4ed8", "analyses_per_day": 50},
-    "paid3":  {"name": "Curator",   "color": "#be123c", "analyses_per_day": 999},
+    "free":   {"name": "Explorer",  "color": "#6b7280", "analyses_per_day": 3,   "model": "gpt-3.5-turbo", "max_speech_tokens": 1500, "max_output_tokens": 1000},
+    "paid1":  {"name": "Speaker",   "color": "#b45309", "analyses_per_day": 20,  "model": "gpt-4o",        "max_speech_tokens": 6000, "max_output_tokens": 3000},
+    "paid2":  {"name": "Coach",     "color": "#1d4ed8", "analyses_per_day": 50,  "model": "gpt-4o",        "max_speech_tokens": 6000, "max_output_tokens": 3500},
+    "paid3":  {"name": "Curator",   "color": "#be123c", "analyses_per_day": 999, "model": "gpt-4o",        "max_speech_tokens": 8000, "max_output_tokens": 3500},
 }
 
-if not os.path.exists("data"):
-    os.makedirs("data")
+# USD per 1M tokeni (input, output), pentru estimarea costului in /admin/usage.
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o":        (2.50, 10.00),
+}
 
 users_file   = "data/users.json"
 history_file = "data/history.json"
 pdf_folder   = "data/pdf"
-if not os.path.exists(pdf_folder):
-    os.makedirs(pdf_folder)
+
+def ensure_data_dirs():
+    os.makedirs(pdf_folder, exist_ok=True)
+
+@contextmanager
+def file_lock(path):
+    """Lock exclusiv intre procese si thread-uri (flock pe path + ".lock"), pentru read-modify-write."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
 
 def load_users():
     if os.path.exists(users_file):
@@ -46,6 +181,7 @@ def load_users():
     }
 
 def save_users(users):
+    ensure_data_dirs()
     with open(users_file, "w") as f:
         json.dump(users, f, indent=2)
 
@@ -349,12 +485,132 @@ def get_score_label(total, max_possible):
         return "La început, dar cu direcție clară 🌱"
 
 def load_history():
+    """Intrarile asa cum sunt salvate; decode_history_entry() le aduce la forma cu "result"."""
     if os.path.exists(history_file):
-        with open(history_file) as f:
+        with open(history_file, encoding="utf-8") as f:
             return json.load(f)
     return []
 
-def save_history(email, text, result, total_score, max_score):
+def iter_history(chunk_size=65536):
+    """Parcurge history.json intrare cu intrare, fara sa incarce tot fisierul in memorie."""
+    if not os.path.exists(history_file):
+        return
+    decoder = json.JSONDecoder()
+    with open(history_file, encoding="utf-8") as f:
+        buf, pos = "", 0
+        started = eof = False
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf):
+                if not started:
+                    if buf[pos] != "[":
+                        raise ValueError(f"{history_file}: se astepta o lista JSON")
+                    started = True
+                    pos += 1
+                    continue
+                if buf[pos] == "]":
+                    return
+                try:
+                    entry, pos = decoder.raw_decode(buf, pos)
+                    yield entry
+                    continue
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+            elif eof:
+                return
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+
+# Intrarile de istoric se salveaza compact: campurile de sumar raman in clar (pentru
+# listare si scoruri fara decodare), iar rezultatul complet si textul discursului stau
+# intr-un blob JSON compact, comprimat zlib cu un dictionar prestabilit si codat base85.
+# Textul se pastreaza ca delta pe cuvinte fata de draftul anterior al aceluiasi speaker,
+# cu un text complet (keyframe) cel mult la fiecare HISTORY_KEYFRAME_INTERVAL revizii.
+# Intrarile vechi, cu "result" in clar, se citesc in continuare.
+HISTORY_CODEC = "zlib-d1"
+HISTORY_KEYFRAME_INTERVAL = 8
+TEXT_TOKEN_RE = re.compile(r"\S+\s*|\s+")
+
+# Dictionarele sunt inghetate: blob-urile existente se decodeaza doar cu dictionarul lor.
+# Pentru un dictionar nou se adauga un codec nou ("zlib-d2"), nu se modifica acesta.
+HISTORY_ZDICTS = {
+    "zlib-d1": "".join([
+        '"recommendation":"', '"reflection_questions":["', '"present":true,', '"present":false,',
+        '"coaching_sessions":[{"day":', '"principle":"', '"status":"', '"text_evidence":"', '"exercise":"',
+        '"example_question":"', '"ted_example":"', '"ted_speaker":"', '"strengths":["', '"next_steps":["',
+        '"summary":"', '"overall_score":', '"coaching_note":"', '"curator_message":"', '"curator_verdict":"',
+        '"what_moved_me":"', '"what_worries_me":"', '"stage_readiness":{"ready_to_present":false,',
+        '"estimated_sessions_needed":', '"priority_action":"', '"curator_message_about_archetype":"',
+        '"archetype":{"primary":"', '"secondary":"', '"emoji":"', '"group":"', '"confidence":"', '"desire":"',
+        '"fear":"', '"evidence":"', '"superpower":"', '"shadow":"', '"shadow_present":"',
+        '"archetype_authenticity_score":', '"archetype_authenticity_note":"',
+        'Inocentul', 'Orfanul', 'Razboinicul', 'Ingrijitorul', 'Exploratorul', 'Rebelul', 'Indragostitul',
+        'Creatorul', 'Conducatorul', 'Magicianul', 'Inteleptul', 'Bufonul', 'Ego-ul', 'Sufletul', 'Sinele',
+        '"Idea Strength":{"score":', '"Structural Integrity":{"score":', '"Cognitive Load":{"score":',
+        '"Emotional Arc":{"score":', '"Memorability Factor":{"score":',
+        'Citeaza un fragment din text', 'studiu de caz', 'speakerul', 'discursul', 'autenticitate',
+        'Gata pentru scena', 'Aproape gata', 'Mai avem de lucru', 'Revenim de la zero',
+        '"nine_principles_check":{"Pasiunea":{"score":', '"Povestea":{"score":', '"Conversatia":{"score":',
+        '"Ceva Nou":{"score":', '"WOW Factor":{"score":', '"Umor":{"score":',
+        '"Regula celor 18 min":{"score":', '"Multisenzorial":{"score":', '"Autenticitate":{"score":',
+        '"curator_note":"', '"score":', '{"tier":"free","analysis":{', '{"tier":"paid1","analysis":{',
+        '{"tier":"paid2","analysis":{', '{"tier":"paid3","analysis":{', '{"result":', '"text":{"full":"',
+        '"text":{"delta":[[0,',
+    ]).encode("utf-8"),
+}
+
+def encode_history_blob(payload):
+    compressor = zlib.compressobj(9, zdict=HISTORY_ZDICTS[HISTORY_CODEC])
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.b85encode(compressor.compress(raw) + compressor.flush()).decode("ascii")
+
+def decode_history_blob(entry):
+    decompressor = zlib.decompressobj(zdict=HISTORY_ZDICTS[entry["codec"]])
+    raw = decompressor.decompress(base64.b85decode(entry["z"])) + decompressor.flush()
+    return json.loads(raw)
+
+def text_delta(previous_text, text):
+    """Operatii pe cuvinte: [a, b] copiaza cuvintele a..b din draftul anterior, "..." insereaza text."""
+    old, new = TEXT_TOKEN_RE.findall(previous_text), TEXT_TOKEN_RE.findall(text)
+    ops = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new, autojunk=False).get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif tag in ("replace", "insert"):
+            ops.append("".join(new[j1:j2]))
+    return ops
+
+def apply_text_delta(previous_text, ops):
+    old = TEXT_TOKEN_RE.findall(previous_text)
+    return "".join("".join(old[op[0]:op[1]]) if isinstance(op, list) else op for op in ops)
+
+def history_entry_text(user_entries, index):
+    """Reconstituie textul complet al intrarii user_entries[index] (None pentru intrari vechi)."""
+    start = index
+    while start >= 0 and "z" in user_entries[start] and user_entries[start].get("text_depth", 0) > 0:
+        start -= 1
+    if start < 0 or "z" not in user_entries[start]:
+        return None
+    keyframe = decode_history_blob(user_entries[start])["text"]
+    if keyframe is None:  # intrare veche convertita cu compact-history, fara text complet
+        return None
+    text = keyframe["full"]
+    for entry in user_entries[start + 1:index + 1]:
+        text = apply_text_delta(text, decode_history_blob(entry)["text"]["delta"])
+    return text
+
+def make_history_entry(email, text, result, total_score, max_score, previous_text=None, previous_depth=0, pdf_file=None):
+    """Intrarea de istoric in formatul compact; previous_* descriu draftul anterior al speakerului,
+    pdf_file e numele scorecard-ului din pdf_folder (linkurile de descarcare se emit din el)."""
+    depth = 0
+    stored_text = {"full": text}
+    if previous_text is not None and previous_depth + 1 < HISTORY_KEYFRAME_INTERVAL:
+        ops = text_delta(previous_text, text)
+        if len(json.dumps(ops, ensure_ascii=False)) < len(text) * 0.6:
+            stored_text, depth = {"delta": ops}, previous_depth + 1
     entry = {
         "timestamp": datetime.now().isoformat(),
         "email": email,
@@ -362,18 +618,74 @@ def save_history(email, text, result, total_score, max_score):
         "tier": result.get("tier", "free"),
         "total_score": total_score,
         "max_score": max_score,
-        "result": result
+        "codec": HISTORY_CODEC,
+        "text_depth": depth,
+        "z": encode_history_blob({"result": result, "text": stored_text}),
     }
-    data = load_history()
-    data.append(entry)
-    with open(history_file, "w") as f:
-        json.dump(data, f, indent=2)
+    if pdf_file:
+        entry["pdf"] = pdf_file
+    return entry
+
+def decode_history_entry(entry, blob=None):
+    """Intrarea in forma pe care o asteapta restul aplicatiei (cu "result"), indiferent de format."""
+    if "z" not in entry:
+        return entry
+    decoded = {k: v for k, v in entry.items() if k not in ("z", "codec", "text_depth")}
+    decoded["result"] = (blob or decode_history_blob(entry))["result"]
+    return decoded
+
+def iter_history_documents():
+    """(intrare decodata, text complet sau None) pentru tot istoricul, cu o decodare per intrare."""
+    last_text = {}
+    for entry in iter_history():
+        email = entry.get("email")
+        text = None
+        if "z" in entry:
+            blob = decode_history_blob(entry)
+            stored = blob["text"]
+            if stored and "full" in stored:
+                text = stored["full"]
+            elif stored and last_text.get(email) is not None:
+                text = apply_text_delta(last_text[email], stored["delta"])
+            entry = decode_history_entry(entry, blob)
+        last_text[email] = text
+        yield entry, text
+
+def save_history(email, text, result, total_score, max_score, pdf_file=None):
+    ensure_data_dirs()
+    # Workerii sunt procese separate: citire + adaugare + scriere sub acelasi flock, altfel
+    # doua salvari simultane pleaca de la aceeasi versiune si una dintre intrari se pierde.
+    with file_lock(history_file):
+        data = load_history()
+        user_entries = [e for e in data if e.get("email") == email]
+        previous_text = history_entry_text(user_entries, len(user_entries) - 1) if user_entries else None
+        previous_depth = user_entries[-1].get("text_depth", 0) if previous_text is not None else 0
+        entry = make_history_entry(email, text, result, total_score, max_score, previous_text, previous_depth, pdf_file)
+        data.append(entry)
+        # Fisier temporar + os.replace: cititorii (fara lock) vad fie versiunea veche, fie pe cea noua.
+        tmp_path = f"{history_file}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, history_file)
+    try:
+        index_history_entry(decode_history_entry(entry), text)
+    except sqlite3.Error as e:
+        print(f"Search index error: {e}")
+    return entry
 
 def get_user_history(email, limit=10):
     """Returneaza ultimele analize ale unui user, cele mai recente primele."""
     data = load_history()
     user_entries = [e for e in data if e.get("email") == email]
-    return list(reversed(user_entries[-limit:]))
+    return [decode_history_entry(e) for e in reversed(user_entries[-limit:])]
+
+def get_history_text(email, timestamp):
+    """Textul complet al unei analize, reconstituit din lantul de delte; None daca nu e pastrat."""
+    user_entries = [e for e in load_history() if e.get("email") == email]
+    for index, entry in enumerate(user_entries):
+        if entry.get("timestamp") == timestamp:
+            return history_entry_text(user_entries, index)
+    return None
 
 def get_previous_score(email, current_timestamp):
     """Returneaza scorul analizei anterioare pentru comparatie."""
@@ -384,7 +696,153 @@ def get_previous_score(email, current_timestamp):
     last = user_entries[-1]
     return last.get("total_score"), last.get("max_score")
 
-def analyze_speech_free(text):
+usage_file = "data/usage.jsonl"
+TRUNCATION_MARKER = "\n[... fragment omis pentru a incadra textul in limita planului ...]\n"
+
+class OutputLimitReached(Exception):
+    """Modelul s-a oprit la max_tokens (finish_reason == "length"): raspunsul e taiat, deci nu e JSON valid."""
+
+    def __init__(self, tier, model, limit):
+        super().__init__(f"{model} a atins plafonul de {limit} tokeni de output al planului {tier}")
+        self.tier, self.model, self.limit = tier, model, limit
+
+def estimate_tokens(text, model=None):
+    """Estimare locala, fara apel de retea: tokenizer-ul modelului prin tiktoken daca e instalat
+    (cl100k_base pentru gpt-3.5-turbo, o200k_base pentru gpt-4o), altfel o euristica."""
+    try:
+        import tiktoken
+    except ImportError:
+        return int(max(len(text) / 3.5, len(text.split()) * 1.3)) + 1
+    try:
+        encoding = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("o200k_base")
+    except KeyError:
+        encoding = tiktoken.get_encoding("o200k_base")
+    return len(encoding.encode(text))
+
+def fit_speech_to_budget(text, tier):
+    """Taie discursul la max_speech_tokens din TIERS, pastrand inceputul (2/3) si finalul (1/3).
+
+    Plafonul priveste doar textul discursului; instructiunile si schema JSON din prompt
+    (fixe per tier) vin peste el si apar separat in prompt_tokens din data/usage.jsonl.
+    Returneaza (text, info); info este None daca textul incape in buget.
+    """
+    budget = TIERS[tier]["max_speech_tokens"]
+    model = TIERS[tier]["model"]
+    original = estimate_tokens(text, model)
+    if original <= budget:
+        return text, None
+    words = text.split()
+    keep = int(len(words) * budget / original)
+    while keep > 0:
+        head = keep * 2 // 3
+        fitted = " ".join(words[:head]) + TRUNCATION_MARKER + " ".join(words[len(words) - (keep - head):])
+        if estimate_tokens(fitted, model) <= budget:
+            break
+        keep = int(keep * 0.95)
+    else:
+        fitted = ""
+    return fitted, {"original_tokens": original, "kept_tokens": estimate_tokens(fitted, model), "budget": budget,
+                    "original_words": len(words), "kept_words": keep}
+
+def record_usage(email, tier, model, usage, estimated_input_tokens, latency_ms=None, call=None, batch=None):
+    """Adauga o linie in data/usage.jsonl cu tokenii raportati de API si costul estimat.
+
+    call eticheteaza apelul (implicit tier-ul; "paid3:archetype" etc. in fan-out), iar batch
+    grupeaza cererile concurente ale aceleiasi analize.
+    """
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None) or 0
+    price_in, price_out = MODEL_PRICES.get(model, (0.0, 0.0))
+    entry = {
+        "timestamp": datetime.now().isoformat(), "email": email, "tier": tier, "model": model,
+        "estimated_input_tokens": estimated_input_tokens, "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens, "cached_tokens": cached_tokens,
+        "cost_usd": round((prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000, 6),
+        "latency_ms": latency_ms, "call": call or tier,
+    }
+    if batch:
+        entry["batch"] = batch
+    ensure_data_dirs()
+    with open(usage_file, "a") as f:
+        f.write(json.dumps(entry) + "\n")
+
+def iter_usage():
+    if not os.path.exists(usage_file):
+        return
+    with open(usage_file) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def summarize_usage(days=30):
+    """Agrega consumul pe zi x tier si pe utilizator, pentru ultimele `days` zile."""
+    since = (datetime.now() - timedelta(days=days)).date().isoformat()
+    empty = lambda: {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+    by_day, by_user, totals = {}, {}, {}
+    for entry in iter_usage():
+        day = entry["timestamp"][:10]
+        if day < since:
+            continue
+        for bucket in (by_day.setdefault(day, {}).setdefault(entry["tier"], empty()),
+                       by_user.setdefault(entry.get("email") or "—", empty()),
+                       totals.setdefault(entry["tier"], empty())):
+            bucket["requests"] += 1
+            bucket["prompt_tokens"] += entry["prompt_tokens"]
+            bucket["completion_tokens"] += entry["completion_tokens"]
+            bucket["cost_usd"] += entry["cost_usd"]
+    return {
+        "days": sorted(by_day.items(), reverse=True),
+        "users": sorted(by_user.items(), key=lambda item: item[1]["cost_usd"], reverse=True),
+        "tiers": totals,
+    }
+
+def check_finish_reason(response, model, tier, email=None, call=None):
+    """Un raspuns oprit la max_tokens e taiat la jumatate: il semnalam in loc sa-l salvam ca analiza."""
+    if response.choices[0].finish_reason == "length":
+        limit = response.usage.completion_tokens if response.usage else TIERS[tier]["max_output_tokens"]
+        print(f"Output limit reached: {call or tier} {model} {email} ({limit} tokens)")
+        raise OutputLimitReached(tier, model, limit)
+
+def chat_completion(prompt, model, tier, email=None):
+    """Apelul catre model, cu plafonul de output al tier-ului; consumul real se inregistreaza."""
+    if ASYNC_MODE:
+        return run_async(async_chat_completion(prompt, model, tier, email))
+    started = time.perf_counter()
+    response = get_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.3,
+        max_tokens=TIERS[tier]["max_output_tokens"]
+    )
+    latency_ms = round((time.perf_counter() - started) * 1000)
+    try:
+        record_usage(email, tier, model, response.usage, estimate_tokens(prompt, model), latency_ms)
+    except OSError as e:
+        print(f"Usage log error: {e}")
+    check_finish_reason(response, model, tier, email)
+    return response.choices[0].message.content.strip()
+
+async def async_chat_completion(prompt, model, tier, email=None, call=None, batch=None, max_tokens=None):
+    """max_tokens implicit e plafonul tier-ului; fan-out-ul da fiecarei parti doar cota ei."""
+    started = time.perf_counter()
+    response = await get_async_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.3,
+        max_tokens=max_tokens or TIERS[tier]["max_output_tokens"]
+    )
+    latency_ms = round((time.perf_counter() - started) * 1000)
+    try:
+        await asyncio.get_running_loop().run_in_executor(
+            get_executor("usage"), record_usage, email, tier, model, response.usage,
+            estimate_tokens(prompt, model), latency_ms, call, batch)
+    except OSError as e:
+        print(f"Usage log error: {e}")
+    check_finish_reason(response, model, tier, email, call)
+    return response.choices[0].message.content.strip()
+
+def analyze_speech_free(text, email=None):
     prompt = f"""
 Esti un evaluator strict de discursuri TEDx.
 Analizeaza urmatorul text si acorda scoruri DIFERENTIATE si JUSTIFICATE.
@@ -402,12 +860,7 @@ Returneaza DOAR un JSON valid, fara alt text:
 
 Text de analizat: {text}
 """
-    response = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3
-    )
-    content = response.choices[0].message.content.strip()
+    content = chat_completion(prompt, TIERS["free"]["model"], "free", email)
     if "```" in content:
         content = content.split("```")[1]
         if content.startswith("json"):
@@ -417,7 +870,7 @@ Text de analizat: {text}
     except:
         return {"tier": "free", "error": content}
 
-def analyze_speech_paid1(text):
+def analyze_speech_paid1(text, email=None):
     case_studies = format_case_studies_for_prompt()
     prompt = f"""
 Esti un evaluator strict de discursuri TEDx, expert in metodologia Carmine Gallo si psihologia arhetipurilor (Carol S. Pearson / Carl Jung).
@@ -467,12 +920,7 @@ Returneaza DOAR un JSON valid:
 
 Text de analizat: {text}
 """
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3
-    )
-    content = response.choices[0].message.content.strip()
+    content = chat_completion(prompt, TIERS["paid1"]["model"], "paid1", email)
     if "```" in content:
         content = content.split("```")[1]
         if content.startswith("json"):
@@ -482,7 +930,7 @@ Text de analizat: {text}
     except:
         return {"tier": "paid1", "error": content}
 
-def analyze_speech_paid2(text):
+def analyze_speech_paid2(text, email=None):
     case_studies = format_case_studies_for_prompt()
     prompt = f"""
 Esti un coach avansat de TED talks, expert in metodologia Carmine Gallo si psihologia arhetipurilor (Carol S. Pearson / Carl Jung).
@@ -534,12 +982,7 @@ Returneaza DOAR un JSON valid:
 
 Text de analizat: {text}
 """
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3
-    )
-    content = response.choices[0].message.content.strip()
+    content = chat_completion(prompt, TIERS["paid2"]["model"], "paid2", email)
     if "```" in content:
         content = content.split("```")[1]
         if content.startswith("json"):
@@ -549,32 +992,12 @@ Text de analizat: {text}
     except:
         return {"tier": "paid2", "error": content}
 
-def analyze_speech_paid3(text):
-    case_studies = format_case_studies_for_prompt()
-    prompt = f"""
-Esti Tibi Ruczui, curatorul TEDxBrasov, cu 10+ ani de experienta.
-Esti expert in metodologia Carmine Gallo SI in psihologia arhetipurilor Carol S. Pearson / Carl Jung.
-Vorbesti direct cu speakerul, ca un mentor personal, cald dar EXIGENT si CRITIC.
-Motto-ul tau: "{MOTTO}"
-
-{GALLO_9_PRINCIPLES}
-{SCORING_GUIDE}
-{case_studies}
-
-CELE 12 ARHETIPURI (Carol S. Pearson / Carl Jung):
-{ARCHETYPES_FOR_PROMPT}
+# Schema JSON paid3, pe blocuri: apelul unic le cere pe toate, modul fan-out (PAID3_FANOUT=1)
+# cere fiecare grup in paralel, cu acelasi prefix de prompt (persona, ghiduri, studii de caz,
+# textul), ca OpenAI sa refoloseasca prefixul din cache. merge_paid3_parts() reface schema.
+PAID3_FANOUT = os.environ.get("PAID3_FANOUT") == "1"
 
-IMPORTANT:
-- Identifica arhetipul dominant SI secundar.
-- Evalueaza autenticitatea arhetipala: vorbeste din DORINTA sau din TEAMA?
-- Pentru Autenticitate: 3 intrebari de reflectie profunda.
-- Fiecare scor justificat cu citat din text.
-- NU penaliza un Explorator pentru umor mic.
-- Scorurile TREBUIE sa fie diferite.
-
-Returneaza DOAR un JSON valid:
-{{
-  "archetype": {{
+PAID3_ARCHETYPE_SCHEMA = """  "archetype": {
     "primary": "Numele arhetipului dominant",
     "secondary": "Numele arhetipului secundar",
     "emoji": "emoji",
@@ -590,58 +1013,159 @@ Returneaza DOAR un JSON valid:
     "shadow_present": "Apare umbra in text? Da/Nu si cum",
     "archetype_authenticity_score": 0,
     "archetype_authenticity_note": "Vorbeste din dorinta sau din teama?"
-  }},
-  "curator_message": "Mesaj personal direct (3-4 propozitii)",
+  }"""
+
+PAID3_NARRATIVE_SCHEMA = '''  "curator_message": "Mesaj personal direct (3-4 propozitii)",
   "overall_score": 0,
   "curator_verdict": "Gata pentru scena|Aproape gata|Mai avem de lucru|Revenim de la zero",
   "what_moved_me": "Ce te-a impresionat, cu citat",
-  "what_worries_me": "Ce te ingrijoreaza, cu citat",
-  "nine_principles_check": {{
-    "Pasiunea": {{ "score": 0, "curator_note": "Citat + observatie + studiu de caz daca scorul < 7" }},
-    "Povestea": {{ "score": 0, "curator_note": "..." }},
-    "Conversatia": {{ "score": 0, "curator_note": "..." }},
-    "Ceva Nou": {{ "score": 0, "curator_note": "..." }},
-    "WOW Factor": {{ "score": 0, "curator_note": "..." }},
-    "Umor": {{ "score": 0, "curator_note": "..." }},
-    "Regula celor 18 min": {{ "score": 0, "curator_note": "..." }},
-    "Multisenzorial": {{ "score": 0, "curator_note": "..." }},
-    "Autenticitate": {{ "score": 0, "reflection_questions": ["intrebare 1", "intrebare 2", "intrebare 3"] }}
-  }},
-  "stage_readiness": {{
+  "what_worries_me": "Ce te ingrijoreaza, cu citat"'''
+
+PAID3_PRINCIPLE_SCHEMAS = {
+    "Pasiunea": '{ "score": 0, "curator_note": "Citat + observatie + studiu de caz daca scorul < 7" }',
+    "Povestea": '{ "score": 0, "curator_note": "..." }',
+    "Conversatia": '{ "score": 0, "curator_note": "..." }',
+    "Ceva Nou": '{ "score": 0, "curator_note": "..." }',
+    "WOW Factor": '{ "score": 0, "curator_note": "..." }',
+    "Umor": '{ "score": 0, "curator_note": "..." }',
+    "Regula celor 18 min": '{ "score": 0, "curator_note": "..." }',
+    "Multisenzorial": '{ "score": 0, "curator_note": "..." }',
+    "Autenticitate": '{ "score": 0, "reflection_questions": ["intrebare 1", "intrebare 2", "intrebare 3"] }',
+}
+
+PAID3_READINESS_SCHEMA = """  "stage_readiness": {
     "ready_to_present": false,
     "estimated_sessions_needed": 0,
     "priority_action": "Cel mai important lucru de facut acum"
-  }}
-}}
+  }"""
+
+def paid3_principles_schema(names):
+    lines = ",\n".join(f'    "{name}": {PAID3_PRINCIPLE_SCHEMAS[name]}' for name in names)
+    return '  "nine_principles_check": {\n' + lines + "\n  }"
+
+def paid3_json_schema(*blocks):
+    return "{\n" + ",\n".join(blocks) + "\n}"
+
+PAID3_FULL_SCHEMA = paid3_json_schema(PAID3_ARCHETYPE_SCHEMA, PAID3_NARRATIVE_SCHEMA,
+                                      paid3_principles_schema(PAID3_PRINCIPLE_SCHEMAS), PAID3_READINESS_SCHEMA)
+PAID3_FANOUT_PARTS = {
+    "archetype": paid3_json_schema(PAID3_ARCHETYPE_SCHEMA),
+    "principles_1_5": paid3_json_schema(paid3_principles_schema(list(PAID3_PRINCIPLE_SCHEMAS)[:5])),
+    "principles_6_9": paid3_json_schema(paid3_principles_schema(list(PAID3_PRINCIPLE_SCHEMAS)[5:])),
+    "narrative": paid3_json_schema(PAID3_NARRATIVE_SCHEMA, PAID3_READINESS_SCHEMA),
+}
+PAID3_NARRATIVE_KEYS = tuple(json.loads(paid3_json_schema(PAID3_NARRATIVE_SCHEMA)))
+# Ce parte din max_output_tokens al tier-ului primeste fiecare cerere din fan-out, dupa
+# cat text cere schema ei; plafoanele insumate raman cel al apelului unic.
+PAID3_FANOUT_OUTPUT_SHARES = {"archetype": 0.30, "principles_1_5": 0.25, "principles_6_9": 0.20, "narrative": 0.25}
 
-Text de analizat: {text}
+def paid3_fanout_caps(total):
+    caps = {name: int(total * share) for name, share in PAID3_FANOUT_OUTPUT_SHARES.items()}
+    caps["narrative"] += total - sum(caps.values())
+    return caps
+
+def paid3_prompt_prefix():
+    case_studies = format_case_studies_for_prompt()
+    return f"""
+Esti Tibi Ruczui, curatorul TEDxBrasov, cu 10+ ani de experienta.
+Esti expert in metodologia Carmine Gallo SI in psihologia arhetipurilor Carol S. Pearson / Carl Jung.
+Vorbesti direct cu speakerul, ca un mentor personal, cald dar EXIGENT si CRITIC.
+Motto-ul tau: "{MOTTO}"
+
+{GALLO_9_PRINCIPLES}
+{SCORING_GUIDE}
+{case_studies}
+
+CELE 12 ARHETIPURI (Carol S. Pearson / Carl Jung):
+{ARCHETYPES_FOR_PROMPT}
+
+IMPORTANT:
+- Identifica arhetipul dominant SI secundar.
+- Evalueaza autenticitatea arhetipala: vorbeste din DORINTA sau din TEAMA?
+- Pentru Autenticitate: 3 intrebari de reflectie profunda.
+- Fiecare scor justificat cu citat din text.
+- NU penaliza un Explorator pentru umor mic.
+- Scorurile TREBUIE sa fie diferite.
 """
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3
-    )
-    content = response.choices[0].message.content.strip()
+
+def parse_model_json(content):
     if "```" in content:
         content = content.split("```")[1]
         if content.startswith("json"):
             content = content[4:]
+    return json.loads(content)
+
+def merge_paid3_parts(parts):
+    """Compune raspunsurile partiale (dict-uri, in ordinea PAID3_FANOUT_PARTS) in schema apelului unic."""
+    archetype, principles_a, principles_b, narrative = parts
+    analysis = {"archetype": archetype.get("archetype", {})}
+    analysis.update((k, narrative[k]) for k in PAID3_NARRATIVE_KEYS if k in narrative)
+    analysis["nine_principles_check"] = {**principles_a.get("nine_principles_check", {}),
+                                         **principles_b.get("nine_principles_check", {})}
+    analysis["stage_readiness"] = narrative.get("stage_readiness", {})
+    return analysis
+
+async def gather_completions(prompts, model, tier, email=None, calls=None, batch=None, max_tokens=None):
+    calls = calls or [None] * len(prompts)
+    max_tokens = max_tokens or [None] * len(prompts)
+    return await asyncio.gather(*(async_chat_completion(p, model, tier, email, call, batch, cap)
+                                  for p, call, cap in zip(prompts, calls, max_tokens)))
+
+def analyze_speech_paid3(text, email=None):
+    if PAID3_FANOUT:
+        return analyze_speech_paid3_fanout(text, email)
+    prompt = f"""{paid3_prompt_prefix()}
+Returneaza DOAR un JSON valid:
+{PAID3_FULL_SCHEMA}
+
+Text de analizat: {text}
+"""
+    content = chat_completion(prompt, TIERS["paid3"]["model"], "paid3", email)
     try:
-        return {"tier": "paid3", "analysis": json.loads(content)}
+        return {"tier": "paid3", "analysis": parse_model_json(content)}
     except:
         return {"tier": "paid3", "error": content}
 
-def analyze_by_tier(text, tier):
-    if tier == "paid3":
-        return analyze_speech_paid3(text)
-    elif tier == "paid2":
-        return analyze_speech_paid2(text)
-    elif tier == "paid1":
-        return analyze_speech_paid1(text)
-    else:
-        return analyze_speech_free(text)
+def analyze_speech_paid3_fanout(text, email=None):
+    """Aceeasi analiza paid3, din 4 cereri concurente; latenta e a celei mai lungi parti."""
+    prefix = f"""{paid3_prompt_prefix()}
+Text de analizat: {text}
+"""
+    prompts = [f"""{prefix}
+Returneaza DOAR un JSON valid, doar cu aceasta sectiune a evaluarii:
+{schema}
+""" for schema in PAID3_FANOUT_PARTS.values()]
+    calls = [f"paid3:{name}" for name in PAID3_FANOUT_PARTS]
+    caps = paid3_fanout_caps(TIERS["paid3"]["max_output_tokens"])
+    contents = run_async(gather_completions(prompts, TIERS["paid3"]["model"], "paid3", email, calls,
+                                            secrets.token_hex(4), [caps[name] for name in PAID3_FANOUT_PARTS]))
+    parts = []
+    for content in contents:
+        try:
+            parts.append(parse_model_json(content))
+        except:
+            return {"tier": "paid3", "error": content}
+    return {"tier": "paid3", "analysis": merge_paid3_parts(parts)}
+
+def analyze_by_tier(text, tier, email=None):
+    text, truncation = fit_speech_to_budget(text, tier)
+    try:
+        if tier == "paid3":
+            result = analyze_speech_paid3(text, email)
+        elif tier == "paid2":
+            result = analyze_speech_paid2(text, email)
+        elif tier == "paid1":
+            result = analyze_speech_paid1(text, email)
+        else:
+            result = analyze_speech_free(text, email)
+    except OutputLimitReached as e:
+        result = {"tier": tier, "output_truncated": {"model": e.model, "limit": e.limit}}
+    if truncation:
+        result["input_truncated"] = truncation
+    return result
 
 def generate_radar_image(scores, filename="radar.png"):
+    plt, np = load_plotting()
     labels = list(scores.keys())
     num_vars = len(labels)
     values = list(scores.values())
@@ -668,9 +1192,112 @@ def generate_radar_image(scores, filename="radar.png"):
 def clean(text):
     return str(text).encode('latin-1', 'replace').decode('latin-1')
 
-def generate_pdf(text, result, user_name, tier, total_score=0, max_score=0):
-    pdf_filename = f"{pdf_folder}/scorecard_{datetime.now().strftime('%Y%m%d%H%M%S')}.pdf"
-    analysis = result.get("analysis", {})
+# Fontul Unicode pentru PDF (diacritice, liniuta de dialog): DejaVu Sans, livrat cu
+# matplotlib sau din PDF_FONT_DIR. Metricile se parseaza o singura data per proces;
+# fiecare PDF primeste exact subsetul de glife folosite. PDF_CORE_FONTS=1 revine la Arial.
+PDF_FONT_FAMILY = "DejaVu"
+PDF_FONT_FILES = {"": "DejaVuSans.ttf", "B": "DejaVuSans-Bold.ttf", "I": "DejaVuSans-Oblique.ttf"}
+PDF_CORE_FONTS = os.environ.get("PDF_CORE_FONTS") == "1"
+_pdf_font_metrics = {}
+
+class GlyphSubset(list):
+    """Lista de coduri pe care FPDF o tine pentru subset, cu test de apartenenta O(1):
+    _putTTfontwidths face `cid in subset` pentru fiecare cod pana la maxUni."""
+
+    def __init__(self, codes=()):
+        super().__init__(codes)
+        self._codes = set(self)
+
+    def append(self, code):
+        super().append(code)
+        self._codes.add(code)
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._codes = set(self)
+
+    def __contains__(self, code):
+        return code in self._codes
+
+def pdf_font_dir():
+    font_dir = os.environ.get("PDF_FONT_DIR")
+    if font_dir:
+        return font_dir
+    import matplotlib
+    return os.path.join(matplotlib.get_data_path(), "fonts", "ttf")
+
+def fpdf_internals_supported():
+    """Cache-ul de fonturi foloseste interne din fpdf 1.7.x (TTFontFile, FPDF.fonts/font_files),
+    nu API-ul public; la alta versiune se revine la Arial in loc sa se strice PDF-ul."""
+    import fpdf
+    import fpdf.fpdf
+    ttf = getattr(fpdf.fpdf, "TTFontFile", None)
+    return (str(getattr(fpdf, "FPDF_VERSION", "")).startswith("1.7.") and ttf is not None
+            and all(callable(getattr(ttf, name, None)) for name in ("getMetrics", "makeSubset")))
+
+def load_pdf_font_metrics():
+    """Parseaza fonturile TTF o singura data; {} daca lipsesc (se revine la Arial)."""
+    if _pdf_font_metrics:
+        return _pdf_font_metrics
+    if not fpdf_internals_supported():
+        print("PDF font cache error: unsupported fpdf version, using Arial")
+        return {}
+    from fpdf.ttfonts import TTFontFile
+    font_dir = pdf_font_dir()
+    metrics = {}
+    for style, filename in PDF_FONT_FILES.items():
+        path = os.path.join(font_dir, filename)
+        if not os.path.exists(path):
+            print(f"PDF font missing: {path}")
+            return {}
+        ttf = TTFontFile()
+        try:
+            ttf.getMetrics(path)
+        except Exception as e:
+            print(f"PDF font error: {path}: {e}")
+            return {}
+        metrics[style] = {
+            "name": re.sub("[ ()]", "", ttf.fullName),
+            "desc": {
+                "Ascent": int(round(ttf.ascent)), "Descent": int(round(ttf.descent)),
+                "CapHeight": int(round(ttf.capHeight)), "Flags": ttf.flags,
+                "FontBBox": "[%s %s %s %s]" % tuple(int(round(v)) for v in ttf.bbox),
+                "ItalicAngle": int(ttf.italicAngle), "StemV": int(round(ttf.stemV)),
+                "MissingWidth": int(round(ttf.defaultWidth)),
+            },
+            "up": round(ttf.underlinePosition), "ut": round(ttf.underlineThickness),
+            "cw": ttf.charWidths, "ttffile": path, "originalsize": os.stat(path).st_size,
+        }
+    _pdf_font_metrics.update(metrics)
+    return _pdf_font_metrics
+
+def setup_pdf_fonts(pdf):
+    """Inregistreaza fontul Unicode pe `pdf` din cache (echivalentul FPDF.add_font(uni=True)
+    fara re-parsarea fisierului). Returneaza (familia, functia de curatare a textului)."""
+    metrics = {} if PDF_CORE_FONTS else load_pdf_font_metrics()
+    if not metrics or not isinstance(getattr(pdf, "fonts", None), dict) \
+            or not isinstance(getattr(pdf, "font_files", None), dict):
+        return "Arial", clean
+    family = PDF_FONT_FAMILY.lower()
+    for style, m in metrics.items():
+        fontkey = family + style
+        pdf.fonts[fontkey] = {
+            "i": len(pdf.fonts) + 1, "type": "TTF", "name": m["name"], "desc": m["desc"],
+            "up": m["up"], "ut": m["ut"], "cw": m["cw"], "ttffile": m["ttffile"],
+            "fontkey": fontkey, "subset": GlyphSubset(range(0, 57 if hasattr(pdf, "str_alias_nb_pages") else 32)),
+            "unifilename": None,
+        }
+        pdf.font_files[fontkey] = {"length1": m["originalsize"], "type": "TTF", "ttffile": m["ttffile"]}
+        pdf.font_files[m["ttffile"]] = {"type": "TTF"}
+    widths = metrics[""]["cw"]
+
+    def clean_unicode(text):
+        # Caracterele fara glifa in font (emoji, selectori de variatie) sunt omise, nu inlocuite cu "?".
+        return "".join(c for c in str(text) if c == "\n" or (ord(c) < len(widths) and widths[ord(c)]))
+    return PDF_FONT_FAMILY, clean_unicode
+
+def extract_scores(analysis, tier):
+    """Scorurile pe criteriu/principiu, asa cum apar pe radar: {nume: scor}."""
     scores = {}
     if tier == "free":
         scores = {k: v.get("score", 0) for k, v in analysis.items() if isinstance(v, dict)}
@@ -682,30 +1309,42 @@ def generate_pdf(text, result, user_name, tier, total_score=0, max_score=0):
     elif tier == "paid3":
         principles = analysis.get("nine_principles_check", {})
         scores = {k: v.get("score", 0) for k, v in principles.items()}
+    return scores
+
+def new_pdf_filename():
+    return f"{pdf_folder}/scorecard_{datetime.now().strftime('%Y%m%d%H%M%S')}_{secrets.token_hex(4)}.pdf"
+
+def generate_pdf(text, result, user_name, tier, total_score=0, max_score=0, pdf_filename=None):
+    FPDF = load_fpdf()
+    ensure_data_dirs()
+    pdf_filename = pdf_filename or new_pdf_filename()
+    analysis = result.get("analysis", {})
+    scores = extract_scores(analysis, tier)
     radar_img = None
     if scores:
         radar_img = generate_radar_image(scores, filename=pdf_filename.replace(".pdf", ".png"))
         time.sleep(0.5)
     pdf = FPDF()
+    font, clean = setup_pdf_fonts(pdf)
     pdf.add_page()
-    pdf.set_font("Arial", "B", 18)
+    pdf.set_font(font, "B", 18)
     pdf.cell(0, 12, "Speaker Lab AI - TEDxBrasov", ln=True, align="C")
-    pdf.set_font("Arial", "I", 9)
+    pdf.set_font(font, "I", 9)
     pdf.multi_cell(0, 6, clean(MOTTO))
-    pdf.set_font("Arial", "", 10)
+    pdf.set_font(font, "", 10)
     pdf.cell(0, 6, clean(f"Speaker: {user_name} | Tier: {TIERS[tier]['name']} | {datetime.now().strftime('%d.%m.%Y %H:%M')}"), ln=True, align="C")
     if total_score and max_score:
-        pdf.set_font("Arial", "B", 14)
+        pdf.set_font(font, "B", 14)
         label = get_score_label(total_score, max_score)
         pdf.cell(0, 10, clean(f"SCOR TOTAL: {total_score}/{max_score} — {label}"), ln=True, align="C")
     pdf.ln(6)
     archetype = analysis.get("archetype")
     if archetype and isinstance(archetype, dict):
-        pdf.set_font("Arial", "B", 13)
+        pdf.set_font(font, "B", 13)
         primary = archetype.get("primary", "")
         secondary = archetype.get("secondary", "")
         pdf.cell(0, 8, clean(f"Arhetip dominant: {primary} | Secundar: {secondary}"), ln=True)
-        pdf.set_font("Arial", "", 10)
+        pdf.set_font(font, "", 10)
         pdf.multi_cell(0, 6, clean(f"Grup: {archetype.get('group', '')}"))
         pdf.multi_cell(0, 6, clean(f"Dorinta: {archetype.get('desire', '')}"))
         pdf.multi_cell(0, 6, clean(f"Teama/Umbra: {archetype.get('fear', '')}"))
@@ -713,29 +1352,29 @@ def generate_pdf(text, result, user_name, tier, total_score=0, max_score=0):
         if archetype.get("archetype_authenticity_score"):
             pdf.multi_cell(0, 6, clean(f"Autenticitate arhetipala: {archetype.get('archetype_authenticity_score')}/10 — {archetype.get('archetype_authenticity_note', '')}"))
         if archetype.get("curator_message_about_archetype"):
-            pdf.set_font("Arial", "I", 10)
+            pdf.set_font(font, "I", 10)
             pdf.multi_cell(0, 6, clean(archetype.get("curator_message_about_archetype", "")))
         pdf.ln(4)
-    pdf.set_font("Arial", "B", 12)
+    pdf.set_font(font, "B", 12)
     pdf.cell(0, 8, "Discurs analizat:", ln=True)
-    pdf.set_font("Arial", "", 10)
+    pdf.set_font(font, "", 10)
     pdf.multi_cell(0, 6, clean(text[:500] + ("..." if len(text) > 500 else "")))
     pdf.ln(6)
     if tier == "free" and isinstance(analysis, dict):
         for crit, data in analysis.items():
             if isinstance(data, dict):
-                pdf.set_font("Arial", "B", 11)
+                pdf.set_font(font, "B", 11)
                 pdf.cell(0, 7, clean(f"{crit}: {data.get('score', 0)}/10"), ln=True)
-                pdf.set_font("Arial", "", 10)
+                pdf.set_font(font, "", 10)
                 pdf.multi_cell(0, 6, clean(data.get("recommendation", "")))
                 pdf.ln(2)
     elif tier == "paid1" and isinstance(analysis, dict):
         for crit, data in analysis.items():
             if isinstance(data, dict) and crit != "archetype":
                 present = "+" if data.get("present") else "-"
-                pdf.set_font("Arial", "B", 11)
+                pdf.set_font(font, "B", 11)
                 pdf.cell(0, 7, clean(f"{present} {crit}: {data.get('score', 0)}/10"), ln=True)
-                pdf.set_font("Arial", "", 10)
+                pdf.set_font(font, "", 10)
                 if crit == "Autenticitate" and data.get("reflection_questions"):
                     for q in data.get("reflection_questions", []):
                         pdf.multi_cell(0, 6, clean(f"- {q}"))
@@ -745,20 +1384,20 @@ def generate_pdf(text, result, user_name, tier, total_score=0, max_score=0):
     elif tier == "paid2" and isinstance(analysis, dict):
         arch = analysis.get("archetype", {})
         if arch:
-            pdf.set_font("Arial", "B", 12)
+            pdf.set_font(font, "B", 12)
             pdf.cell(0, 8, clean(f"Coaching bazat pe arhetipul: {arch.get('primary','')}"), ln=True)
-            pdf.set_font("Arial", "", 10)
+            pdf.set_font(font, "", 10)
             pdf.multi_cell(0, 6, clean(arch.get("coaching_note", "")))
             pdf.ln(4)
-        pdf.set_font("Arial", "B", 13)
+        pdf.set_font(font, "B", 13)
         pdf.cell(0, 8, clean(f"Scor general AI: {analysis.get('overall_score', 'N/A')}/10"), ln=True)
-        pdf.set_font("Arial", "", 10)
+        pdf.set_font(font, "", 10)
         pdf.multi_cell(0, 6, clean(analysis.get("summary", "")))
         pdf.ln(4)
         for session in analysis.get("coaching_sessions", []):
-            pdf.set_font("Arial", "B", 11)
+            pdf.set_font(font, "B", 11)
             pdf.cell(0, 7, clean(f"Ziua {session.get('day', '')}: {session.get('principle', '')} - {session.get('score', 0)}/10"), ln=True)
-            pdf.set_font("Arial", "", 10)
+            pdf.set_font(font, "", 10)
             if session.get("text_evidence"):
                 pdf.multi_cell(0, 6, clean(f"Din text: {session.get('text_evidence', '')}"))
             pdf.multi_cell(0, 6, clean(f"Exercitiu: {session.get('exercise', '')}"))
@@ -766,24 +1405,24 @@ def generate_pdf(text, result, user_name, tier, total_score=0, max_score=0):
                 pdf.multi_cell(0, 6, clean(f"Studiu de caz: {session.get('ted_example')} - {session.get('ted_speaker', '')}"))
             pdf.ln(2)
     elif tier == "paid3" and isinstance(analysis, dict):
-        pdf.set_font("Arial", "B", 13)
+        pdf.set_font(font, "B", 13)
         pdf.cell(0, 8, clean(f"Verdict curator: {analysis.get('curator_verdict', '')}"), ln=True)
-        pdf.set_font("Arial", "I", 11)
+        pdf.set_font(font, "I", 11)
         pdf.multi_cell(0, 7, clean(analysis.get("curator_message", "")))
         pdf.ln(4)
-        pdf.set_font("Arial", "B", 12)
+        pdf.set_font(font, "B", 12)
         pdf.cell(0, 7, "Ce m-a impresionat:", ln=True)
-        pdf.set_font("Arial", "", 10)
+        pdf.set_font(font, "", 10)
         pdf.multi_cell(0, 6, clean(analysis.get("what_moved_me", "")))
-        pdf.set_font("Arial", "B", 12)
+        pdf.set_font(font, "B", 12)
         pdf.cell(0, 7, "Ce ma ingrijoreaza:", ln=True)
-        pdf.set_font("Arial", "", 10)
+        pdf.set_font(font, "", 10)
         pdf.multi_cell(0, 6, clean(analysis.get("what_worries_me", "")))
         pdf.ln(4)
         for principle, data in analysis.get("nine_principles_check", {}).items():
-            pdf.set_font("Arial", "B", 11)
+            pdf.set_font(font, "B", 11)
             pdf.cell(0, 7, clean(f"{principle}: {data.get('score', 0)}/10"), ln=True)
-            pdf.set_font("Arial", "", 10)
+            pdf.set_font(font, "", 10)
             if principle == "Autenticitate" and data.get("reflection_questions"):
                 for q in data.get("reflection_questions", []):
                     pdf.multi_cell(0, 6, clean(f"- {q}"))
@@ -800,6 +1439,575 @@ def generate_pdf(text, result, user_name, tier, total_score=0, max_score=0):
     pdf.output(pdf_filename)
     return pdf_filename
 
+FREE_CRITERIA = ["Idea Strength", "Structural Integrity", "Cognitive Load", "Emotional Arc", "Memorability Factor"]
+GALLO_PRINCIPLES = ["Pasiunea", "Povestea", "Conversatia", "Ceva Nou", "WOW Factor",
+                    "Umor", "Regula celor 18 min", "Multisenzorial", "Autenticitate"]
+EXPORT_TEXT_COLUMNS = ["timestamp", "email", "tier", "archetype_primary", "archetype_secondary", "text_preview"]
+EXPORT_SCORE_COLUMNS = {f"score_{name.lower().replace(' ', '_')}": name for name in FREE_CRITERIA + GALLO_PRINCIPLES}
+EXPORT_NUMERIC_COLUMNS = ["total_score", "max_score", "archetype_authenticity_score"] + list(EXPORT_SCORE_COLUMNS)
+EXPORT_COLUMNS = (["timestamp", "email", "tier", "total_score", "max_score",
+                   "archetype_primary", "archetype_secondary", "archetype_authenticity_score"]
+                  + list(EXPORT_SCORE_COLUMNS) + ["text_preview"])
+EXPORT_FORMATS = ["csv", "npz", "parquet"]
+
+def filter_history(entries, since=None, until=None, tier=None, email=None):
+    """Filtreaza un flux de intrari; since/until sunt date YYYY-MM-DD, inclusiv."""
+    for entry in entries:
+        day = entry.get("timestamp", "")[:10]
+        if since and day < since:
+            continue
+        if until and day > until:
+            continue
+        if tier and entry.get("tier") != tier:
+            continue
+        if email and entry.get("email") != email:
+            continue
+        yield entry
+
+def flatten_history_entry(entry):
+    """O analiza -> un rand plat, cu cate o coloana de scor pentru fiecare principiu."""
+    result = entry.get("result") or {}
+    analysis = result.get("analysis") or {}
+    archetype = analysis.get("archetype") if isinstance(analysis.get("archetype"), dict) else {}
+    row = {
+        "timestamp": entry.get("timestamp", ""),
+        "email": entry.get("email", ""),
+        "tier": entry.get("tier", ""),
+        "total_score": entry.get("total_score"),
+        "max_score": entry.get("max_score"),
+        "archetype_primary": archetype.get("primary", ""),
+        "archetype_secondary": archetype.get("secondary", ""),
+        "archetype_authenticity_score": archetype.get("archetype_authenticity_score"),
+        "text_preview": entry.get("text_preview", ""),
+    }
+    try:
+        scores = extract_scores(analysis, entry.get("tier", "free"))
+    except (KeyError, AttributeError):
+        scores = {}
+    for column, name in EXPORT_SCORE_COLUMNS.items():
+        row[column] = scores.get(name)
+    return row
+
+def iter_export_rows(**filters):
+    return (flatten_history_entry(decode_history_entry(e)) for e in filter_history(iter_history(), **filters))
+
+def iter_history_csv(rows, flush_size=65536):
+    """Genereaza CSV-ul in bucati de ~64KB, pentru un raspuns streaming."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= flush_size:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+def to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+def write_history_npz(path, **filters):
+    """Export .npz comprimat, cate un array per coloana (np.load(path)["score_umor"]).
+
+    Doua treceri peste istoric: prima numara randurile si latimea coloanelor text,
+    a doua scrie direct in fisiere .npy mapate in memorie, arhivate apoi cu deflate.
+    """
+    import numpy as np
+    count = 0
+    widths = dict.fromkeys(EXPORT_TEXT_COLUMNS, 1)
+    for row in iter_export_rows(**filters):
+        count += 1
+        for column in EXPORT_TEXT_COLUMNS:
+            widths[column] = max(widths[column], len(row[column] or ""))
+    with tempfile.TemporaryDirectory() as tmp:
+        arrays = {}
+        for column in EXPORT_COLUMNS:
+            dtype = f"<U{widths[column]}" if column in widths else np.float64
+            arrays[column] = np.lib.format.open_memmap(os.path.join(tmp, f"{column}.npy"), mode="w+", dtype=dtype, shape=(count,))
+        for i, row in enumerate(iter_export_rows(**filters)):
+            if i >= count:
+                break
+            for column, array in arrays.items():
+                array[i] = (row[column] or "") if column in widths else to_float(row[column])
+        for array in arrays.values():
+            array.flush()
+        arrays.clear()
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for column in EXPORT_COLUMNS:
+                zf.write(os.path.join(tmp, f"{column}.npy"), arcname=f"{column}.npy")
+    return count
+
+def write_history_parquet(path, batch_size=1000, **filters):
+    """Export Parquet in loturi de batch_size randuri; necesita pyarrow."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(c, pa.string() if c in EXPORT_TEXT_COLUMNS else pa.float64()) for c in EXPORT_COLUMNS])
+    count = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        batch = []
+        for row in iter_export_rows(**filters):
+            batch.append({c: row[c] if c in EXPORT_TEXT_COLUMNS else to_float(row[c]) for c in EXPORT_COLUMNS})
+            if len(batch) >= batch_size:
+                writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+def parse_export_filters(since=None, until=None, tier=None, email=None):
+    """Valideaza filtrele de export; ridica ValueError cu un mesaj pentru utilizator."""
+    for value in (since, until):
+        if value:
+            datetime.strptime(value, "%Y-%m-%d")
+    if tier and tier not in TIERS:
+        raise ValueError("Invalid tier")
+    return {"since": since or None, "until": until or None, "tier": tier or None,
+            "email": email.strip().lower() if email else None}
+
+# Cautare in istoricul propriu: index SQLite FTS5 in data/search.sqlite3, derivat din
+# history.json. save_history adauga fiecare analiza noua; daca indexul lipseste, prima
+# cautare porneste constructia intr-un thread de fundal (sau `flask rebuild-search-index`),
+# niciodata in request. Fiecare document poarta un token al proprietarului, asa ca
+# interogarea intersecteaza direct lista userului.
+search_db_file = "data/search.sqlite3"
+SEARCH_NARRATIVE_FIELDS = ("recommendation", "curator_note", "what_moved_me", "what_worries_me", "curator_message",
+                           "summary", "coaching_note", "exercise", "priority_action")
+SEARCH_PAGE_SIZE = 20
+SEARCH_TERM_RE = re.compile(r'"([^"]*)"|(\S+)')
+SEARCH_SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS analyses{suffix} (
+    id INTEGER PRIMARY KEY, email TEXT NOT NULL, timestamp TEXT NOT NULL, tier TEXT,
+    total_score REAL, max_score REAL, score_pct REAL, archetype TEXT, text_preview TEXT,
+    UNIQUE (email, timestamp)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS analyses_fts{suffix} USING fts5(
+    owner, speech, narrative, tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+SEARCH_BUILD_BATCH = 1000
+_search_lock = threading.Lock()
+_search_ready = set()
+_search_builds = set()
+
+def search_schema(suffix=""):
+    return SEARCH_SCHEMA.format(suffix=suffix)
+
+def connect_search_db(path=None):
+    conn = sqlite3.connect(path or search_db_file, timeout=10)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+def search_owner_token(email):
+    return "u" + hashlib.sha1(email.encode("utf-8")).hexdigest()[:20]
+
+def analysis_narrative(value):
+    """Textele narative ale unei analize (recomandari, note de curator etc.), pentru index."""
+    parts = []
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key in SEARCH_NARRATIVE_FIELDS and isinstance(item, str):
+                parts.append(item)
+            else:
+                parts.extend(analysis_narrative(item))
+    elif isinstance(value, list):
+        for item in value:
+            parts.extend(analysis_narrative(item))
+    return parts
+
+def index_document(conn, entry, text, suffix=""):
+    """Indexeaza o intrare decodata; analizele deja indexate (email + timestamp) se sar."""
+    analysis = (entry.get("result") or {}).get("analysis") or {}
+    archetype = analysis.get("archetype") if isinstance(analysis.get("archetype"), dict) else {}
+    total, max_score = entry.get("total_score"), entry.get("max_score")
+    cursor = conn.execute(
+        f"INSERT OR IGNORE INTO analyses{suffix} (email, timestamp, tier, total_score, max_score, score_pct, archetype, text_preview)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (entry["email"], entry["timestamp"], entry.get("tier"), total, max_score,
+         total * 100.0 / max_score if total is not None and max_score else None,
+         archetype.get("primary") or None, entry.get("text_preview", "")))
+    if cursor.rowcount:
+        conn.execute(f"INSERT INTO analyses_fts{suffix} (rowid, owner, speech, narrative) VALUES (?, ?, ?, ?)",
+                     (cursor.lastrowid, search_owner_token(entry["email"]), text or entry.get("text_preview", ""),
+                      "\n".join(analysis_narrative(analysis))))
+
+def catch_up_search_index(conn, last_id):
+    """Copiaza in tabelele noi analizele indexate in cele live dupa inceputul rebuild-ului
+    (id > last_id) si care lipsesc din instantaneul de istoric citit de rebuild."""
+    rows = conn.execute(
+        "SELECT a.*, f.owner, f.speech, f.narrative FROM analyses a CROSS JOIN analyses_fts f ON f.rowid = a.id"
+        " WHERE a.id > ? AND NOT EXISTS (SELECT 1 FROM analyses_new n WHERE n.email = a.email AND n.timestamp = a.timestamp)",
+        (last_id,)).fetchall()
+    for row in rows:
+        cursor = conn.execute(
+            "INSERT INTO analyses_new (email, timestamp, tier, total_score, max_score, score_pct, archetype, text_preview)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (row["email"], row["timestamp"], row["tier"], row["total_score"], row["max_score"],
+             row["score_pct"], row["archetype"], row["text_preview"]))
+        conn.execute("INSERT INTO analyses_fts_new (rowid, owner, speech, narrative) VALUES (?, ?, ?, ?)",
+                     (cursor.lastrowid, row["owner"], row["speech"], row["narrative"]))
+    return len(rows)
+
+def rebuild_search_index(only_if_missing=False):
+    """Reconstruieste indexul din history.json in tabele noi, in acelasi fisier, si le schimba
+    cu cele live intr-o tranzactie scurta; cititorii vad indexul vechi pana la commit.
+
+    Fisierul WAL nu se inlocuieste niciodata. save_history continua sa scrie in tabelele live
+    intre loturi, iar ce a indexat intre timp se copiaza la schimbare (catch-up). Un singur
+    rebuild odata, intre toate procesele: file_lock(search_db_file).
+    """
+    ensure_data_dirs()
+    count = 0
+    with file_lock(search_db_file):
+        if only_if_missing and search_index_ready():
+            return 0
+        conn = connect_search_db()
+        try:
+            conn.executescript(search_schema() + "DROP TABLE IF EXISTS analyses_new;\n"
+                               "DROP TABLE IF EXISTS analyses_fts_new;\n" + search_schema("_new"))
+            # last_id se citeste inaintea istoricului: orice analiza indexata live cu id <= last_id
+            # era deja in history.json cand rebuild-ul l-a deschis.
+            last_id = conn.execute("SELECT coalesce(max(id), 0) FROM analyses").fetchone()[0]
+            for entry, text in iter_history_documents():
+                index_document(conn, entry, text, "_new")
+                count += 1
+                if count % SEARCH_BUILD_BATCH == 0:
+                    conn.commit()
+            conn.commit()
+            conn.execute("BEGIN IMMEDIATE")
+            count += catch_up_search_index(conn, last_id)
+            for statement in ("DROP TABLE analyses", "DROP TABLE analyses_fts",
+                              "ALTER TABLE analyses_new RENAME TO analyses",
+                              "ALTER TABLE analyses_fts_new RENAME TO analyses_fts"):
+                conn.execute(statement)
+            conn.execute("INSERT OR REPLACE INTO search_meta (key, value) VALUES ('built_at', ?)",
+                         (datetime.now().isoformat(),))
+            conn.commit()
+            conn.execute("INSERT INTO analyses_fts (analyses_fts) VALUES ('optimize')")
+            conn.commit()
+        finally:
+            conn.close()
+    _search_ready.add(search_db_file)
+    return count
+
+def search_index_ready():
+    """Indexul e gata dupa primul rebuild complet (randul built_at din search_meta)."""
+    if search_db_file in _search_ready:
+        return True
+    if not os.path.exists(search_db_file):
+        return False
+    conn = connect_search_db()
+    try:
+        row = conn.execute("SELECT value FROM search_meta WHERE key = 'built_at'").fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    finally:
+        conn.close()
+    if row:
+        _search_ready.add(search_db_file)
+    return row is not None
+
+def ensure_search_index():
+    """Construieste indexul daca lipseste, sincron (CLI, benchmark-uri, thread-ul de fundal)."""
+    if not search_index_ready():
+        rebuild_search_index(only_if_missing=True)
+
+def start_search_index_build():
+    """Porneste ensure_search_index intr-un thread de fundal, cel mult unul per proces."""
+    path = search_db_file
+    with _search_lock:
+        if path in _search_builds:
+            return
+        _search_builds.add(path)
+
+    def build():
+        try:
+            ensure_search_index()
+        except (sqlite3.Error, OSError, ValueError) as e:
+            print(f"Search index error: {e}")
+        finally:
+            with _search_lock:
+                _search_builds.discard(path)
+    threading.Thread(target=build, name="search-index-build", daemon=True).start()
+
+def index_history_entry(entry, text):
+    """Actualizarea incrementala a indexului, apelata din save_history. Nu construieste indexul:
+    cat timp lipseste, intrarea ajunge in tabelele live si o preia constructia (catch-up)."""
+    conn = connect_search_db()
+    try:
+        conn.executescript(search_schema())
+        with conn:
+            index_document(conn, entry, text)
+    finally:
+        conn.close()
+
+def fts_query(q):
+    """Textul cautat -> expresie FTS5 pe speech/narrative: frazele intre ghilimele exact, cuvintele ca prefix."""
+    terms = []
+    for phrase, word in SEARCH_TERM_RE.findall(q):
+        if re.search(r"\w", phrase):
+            terms.append('"%s"' % phrase)
+        elif re.search(r"\w", word):
+            terms.append('"%s"*' % word.replace('"', '""'))
+    # Doar coloanele de text: altfel un termen ca "u" ar potrivi prefixul tokenului din owner.
+    return "{speech narrative} : (%s)" % " AND ".join(terms) if terms else ""
+
+def highlight_snippet(snippet):
+    """Fragmentul FTS5 (cu \x02/\x03 in jurul termenilor gasiti) -> HTML escapat, cu <mark>."""
+    return Markup(str(escape(snippet)).replace("\x02", "<mark>").replace("\x03", "</mark>"))
+
+def parse_search_filters(args):
+    """Valideaza filtrele din query string; ridica ValueError cu un mesaj pentru utilizator."""
+    filters = parse_export_filters(args.get("since"), args.get("until"), args.get("tier"))
+    del filters["email"]
+    for key in ("min_score", "max_score"):
+        value = args.get(key, "").strip()
+        try:
+            filters[key] = float(value) if value else None
+        except ValueError:
+            raise ValueError("Scorul trebuie sa fie un numar intre 0 si 100.")
+    filters["archetype"] = args.get("archetype") or None
+    return filters
+
+def search_history(email, q="", since=None, until=None, tier=None, min_score=None, max_score=None,
+                   archetype=None, limit=SEARCH_PAGE_SIZE):
+    """Cauta in analizele unui user. Scorurile sunt procente (total / max * 100).
+
+    Returneaza {"results", "total", "facets": {"tier", "archetype"}, "elapsed_ms"}; fatetele
+    numara rezultatele cu toate celelalte filtre aplicate, fara filtrul fatetei respective.
+    Daca indexul nu e gata, porneste constructia in fundal si intoarce {"building": True} gol.
+    """
+    started = time.perf_counter()
+    if not search_index_ready():
+        start_search_index_build()
+        return {"results": [], "total": 0, "facets": {"tier": [], "archetype": []}, "building": True,
+                "elapsed_ms": (time.perf_counter() - started) * 1000}
+    match = fts_query(q or "")
+    conditions = [
+        (None, "a.email = ?", email),
+        (None, "substr(a.timestamp, 1, 10) >= ?", since),
+        (None, "substr(a.timestamp, 1, 10) <= ?", until),
+        (None, "a.score_pct >= ?", min_score),
+        (None, "a.score_pct <= ?", max_score),
+        ("tier", "a.tier = ?", tier),
+        ("archetype", "a.archetype = ?", archetype),
+    ]
+    if match:
+        # CROSS JOIN fixeaza ordinea: intai lista FTS, apoi metadatele. Altfel SQLite poate
+        # parcurge analizele userului si rula cate o interogare FTS pentru fiecare.
+        source = "analyses_fts CROSS JOIN analyses a ON a.id = analyses_fts.rowid"
+        conditions.insert(0, (None, "analyses_fts MATCH ?", f"owner:{search_owner_token(email)} AND ({match})"))
+    else:
+        source = "analyses a"
+
+    def where(skip=None):
+        active = [(sql, value) for facet, sql, value in conditions
+                  if value is not None and (facet is None or facet != skip)]
+        return " AND ".join(sql for sql, _ in active), [value for _, value in active]
+
+    conn = connect_search_db()
+    try:
+        clause, params = where()
+        if match:
+            columns = ("a.*, snippet(analyses_fts, 1, char(2), char(3), '…', 24) AS speech_snippet,"
+                       " snippet(analyses_fts, 2, char(2), char(3), '…', 24) AS narrative_snippet")
+            order = "bm25(analyses_fts, 0.0, 2.0, 1.0)"
+        else:
+            columns, order = "a.*, a.text_preview AS speech_snippet, '' AS narrative_snippet", "a.timestamp DESC"
+        rows = conn.execute(f"SELECT {columns} FROM {source} WHERE {clause} ORDER BY {order} LIMIT ?",
+                            params + [limit]).fetchall()
+        total = conn.execute(f"SELECT count(*) FROM {source} WHERE {clause}", params).fetchone()[0]
+        facets = {}
+        for facet in ("tier", "archetype"):
+            clause, params = where(skip=facet)
+            facets[facet] = conn.execute(
+                f"SELECT a.{facet}, count(*) FROM {source} WHERE {clause} AND a.{facet} IS NOT NULL"
+                f" GROUP BY a.{facet} ORDER BY count(*) DESC", params).fetchall()
+    finally:
+        conn.close()
+    results = []
+    for row in rows:
+        result = dict(row)
+        result["speech_snippet"] = highlight_snippet(row["speech_snippet"] or "")
+        result["narrative_snippet"] = highlight_snippet(row["narrative_snippet"] or "")
+        results.append(result)
+    return {"results": results, "total": total, "facets": {k: [tuple(r) for r in v] for k, v in facets.items()},
+            "elapsed_ms": (time.perf_counter() - started) * 1000}
+
+# Profilare la cerere (admin): un thread esantioneaza stiva request-ului la fiecare
+# PROFILE_INTERVAL secunde si salveaza stivele colapsate in data/profiles/.
+# Setarile stau in data/profiling.json, ca sa fie vazute de toti workerii gunicorn;
+# fiecare worker le reciteste cel mult o data la PROFILING_REFRESH_SECONDS.
+profiling_file   = "data/profiling.json"
+profiles_folder  = "data/profiles"
+PROFILE_INTERVAL = 0.005
+PROFILING_REFRESH_SECONDS = 5
+MAX_PROFILES = 50
+PROFILE_ID_RE = re.compile(r"^[\w.-]+$")
+# Doar request-urile de pagina consuma un slot N / intra in esantionare; iconitele,
+# manifestul si service worker-ul sunt cerute automat de browser la fiecare pagina.
+PROFILING_SKIP_ENDPOINTS = ("profiling", "profile_detail", "profile_folded", "static", "serve_asset",
+                            "serve_icon_192", "serve_icon_512", "service_worker")
+_profiling_cache = {"checked": float("-inf"), "mtime": None, "settings": {"sample_rate": 0.0, "users": {}}}
+
+def load_profiling_settings():
+    if os.path.exists(profiling_file):
+        with open(profiling_file) as f:
+            settings = json.load(f)
+        if not math.isfinite(settings.get("sample_rate", 0.0)):
+            settings["sample_rate"] = 0.0
+        return settings
+    return {"sample_rate": 0.0, "users": {}}
+
+def save_profiling_settings(settings):
+    """Scriere atomica; apelantii care citesc-modifica-scriu tin file_lock(profiling_file)."""
+    ensure_data_dirs()
+    tmp_path = f"{profiling_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(settings, f, indent=2)
+    os.replace(tmp_path, profiling_file)
+    _profiling_cache.update(checked=time.monotonic(), mtime=os.path.getmtime(profiling_file), settings=settings)
+
+def get_profiling_settings():
+    now = time.monotonic()
+    if now - _profiling_cache["checked"] >= PROFILING_REFRESH_SECONDS:
+        _profiling_cache["checked"] = now
+        mtime = os.path.getmtime(profiling_file) if os.path.exists(profiling_file) else None
+        if mtime != _profiling_cache["mtime"]:
+            _profiling_cache["mtime"] = mtime
+            _profiling_cache["settings"] = load_profiling_settings()
+    return _profiling_cache["settings"]
+
+def claim_profiling_slot(email):
+    """Consuma unul din cele N request-uri cerute de admin; False daca nu mai are."""
+    with file_lock(profiling_file):
+        settings = load_profiling_settings()
+        remaining = settings.get("users", {}).get(email, 0)
+        if remaining <= 0:
+            return False
+        if remaining == 1:
+            del settings["users"][email]
+        else:
+            settings["users"][email] = remaining - 1
+        save_profiling_settings(settings)
+    return True
+
+class StackSampler(threading.Thread):
+    """Profiler statistic pentru un singur thread: numara stivele colapsate (radacina;...;frunza)."""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                where = os.path.join(os.path.basename(os.path.dirname(code.co_filename)), os.path.basename(code.co_filename))
+                stack.append(f"{code.co_name} ({where}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.duration = time.perf_counter() - self.started
+
+def save_profile(sampler, path, method, email, status):
+    ensure_data_dirs()
+    os.makedirs(profiles_folder, exist_ok=True)
+    endpoint = re.sub(r"[^\w-]+", "_", path.strip("/")) or "index"
+    profile_id = f"{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{os.getpid()}_{endpoint[:40]}"
+    profile = {
+        "id": profile_id, "timestamp": datetime.now().isoformat(), "path": path, "method": method,
+        "email": email, "status": status, "duration_ms": round(sampler.duration * 1000, 1),
+        "interval_ms": sampler.interval * 1000, "samples": dict(sampler.samples),
+    }
+    with open(os.path.join(profiles_folder, f"{profile_id}.json"), "w") as f:
+        json.dump(profile, f)
+    for old in list_profile_ids()[MAX_PROFILES:]:
+        os.remove(os.path.join(profiles_folder, f"{old}.json"))
+
+def list_profile_ids():
+    """Id-urile profilurilor salvate, cele mai recente primele."""
+    if not os.path.exists(profiles_folder):
+        return []
+    return sorted((f[:-5] for f in os.listdir(profiles_folder) if f.endswith(".json")), reverse=True)
+
+def load_profile(profile_id):
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    path = os.path.join(profiles_folder, f"{profile_id}.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def flamegraph_rects(samples, min_fraction=0.002):
+    """Transforma stivele colapsate in dreptunghiuri {depth, x, width, name, count} (x/width in %)."""
+    total = sum(samples.values())
+    if not total:
+        return [], 0
+    tree = {"children": {}, "count": 0}
+    for stack, count in samples.items():
+        node = tree
+        node["count"] += count
+        for name in stack.split(";"):
+            node = node["children"].setdefault(name, {"children": {}, "count": 0})
+            node["count"] += count
+    rects = []
+    pending = [(tree, 0.0, -1, "all")]
+    while pending:
+        node, x, depth, name = pending.pop()
+        if depth >= 0:
+            rects.append({"depth": depth, "x": x / total * 100, "width": node["count"] / total * 100,
+                          "name": name, "count": node["count"]})
+        offset = x
+        for child_name, child in sorted(node["children"].items()):
+            if child["count"] / total >= min_fraction:
+                pending.append((child, offset, depth + 1, child_name))
+            offset += child["count"]
+    return sorted(rects, key=lambda r: (r["depth"], r["x"])), max((r["depth"] for r in rects), default=0) + 1
+
+@app.before_request
+def start_request_profiler():
+    settings = get_profiling_settings()
+    if not settings.get("sample_rate") and not settings.get("users"):
+        return
+    if request.endpoint in PROFILING_SKIP_ENDPOINTS:
+        return
+    email = session.get("user_email")
+    if not (email in settings.get("users", {}) and claim_profiling_slot(email)) and random.random() >= settings.get("sample_rate", 0):
+        return
+    g.profiler = StackSampler(threading.get_ident())
+    g.profiler.start()
+
+@app.teardown_request
+def stop_request_profiler(exc=None):
+    sampler = g.pop("profiler", None)
+    if sampler is None:
+        return
+    sampler.stop()
+    try:
+        save_profile(sampler, request.path, request.method, session.get("user_email"), "error" if exc else "ok")
+    except OSError as e:
+        print(f"Profile save error: {e}")
+
 @app.route("/login", methods=["GET", "POST"])
 def login():
     if request.method == "POST":
@@ -839,7 +2047,11 @@ def register():
 @app.route("/logout")
 def logout():
     session.clear()
-    return redirect(url_for("login"))
+    response = redirect(url_for("login"))
+    # Pagina /history din cache-ul service worker-ului e a userului care iese; pe un
+    # dispozitiv comun urmatorul ar vedea-o offline. Service worker-ul o sterge si el.
+    response.headers["Clear-Site-Data"] = '"cache"'
+    return response
 
 @app.route("/", methods=["GET", "POST"])
 @login_required
@@ -847,6 +2059,7 @@ def index():
     user = get_current_user()
     result = None
     pdf_file = ""
+    pdf_url = ""
     total_score = 0
     max_score = 0
     score_label = ""
@@ -858,16 +2071,25 @@ def index():
     if request.method == "POST":
         text = request.form.get("speech_text", "")
         if text.strip():
-            result = analyze_by_tier(text, user["tier"])
+            result = analyze_by_tier(text, user["tier"], user["email"])
+        if result and not result.get("output_truncated"):
             total_score, max_score = calculate_total_score(result)
             score_label = get_score_label(total_score, max_score)
             current_timestamp = datetime.now().isoformat()
             prev_score, prev_max = get_previous_score(user["email"], current_timestamp)
             if prev_score is not None and prev_max == max_score:
                 score_diff = total_score - prev_score
-            save_history(user["email"], text, result, total_score, max_score)
+            # Numele PDF-ului se alege inainte, ca istoricul si PDF-ul sa se scrie in paralel;
+            # linkul afisat e cel stabil din istoric, care emite un token nou la fiecare click.
+            pdf_path = new_pdf_filename()
+            history_job = submit_blocking("history", save_history, user["email"], text, result, total_score, max_score,
+                                          os.path.basename(pdf_path))
+            pdf_job = submit_blocking("pdf", generate_pdf, text, result, user.get("name", "Speaker"), user["tier"],
+                                      total_score, max_score, pdf_path)
+            entry = history_job.result()
             try:
-                pdf_file = generate_pdf(text, result, user.get("name", "Speaker"), user["tier"], total_score, max_score)
+                pdf_file = pdf_job.result()
+                pdf_url = url_for("history_pdf", timestamp=entry["timestamp"])
             except Exception as e:
                 print(f"PDF error: {e}")
 
@@ -876,6 +2098,7 @@ def index():
     return render_template("index.html",
         result=result,
         pdf_file=pdf_file,
+        pdf_url=pdf_url,
         user=user,
         tiers=TIERS,
         total_score=total_score,
@@ -893,6 +2116,28 @@ def history_page():
     history = get_user_history(user["email"], limit=20)
     return render_template("history.html", user=user, tiers=TIERS, history=history)
 
+@app.route("/history/search")
+@login_required
+def history_search():
+    user = get_current_user()
+    q = request.args.get("q", "").strip()
+    try:
+        filters = parse_search_filters(request.args)
+    except ValueError as e:
+        flash(str(e))
+        filters = {}
+    found = search_history(user["email"], q, **filters)
+
+    def facet_url(name, value=None):
+        args = request.args.to_dict()
+        args.pop(name, None)
+        if value is not None:
+            args[name] = value
+        return url_for("history_search", **args)
+
+    return render_template("search.html", user=user, tiers=TIERS, q=q, filters=filters, found=found,
+                           archetypes=ARCHETYPES, facet_url=facet_url)
+
 @app.route("/upgrade")
 @login_required
 def upgrade():
@@ -924,22 +2169,380 @@ def admin():
     users = load_users()
     return render_template("admin.html", user=user, users=users, tiers=TIERS)
 
-@app.route("/download/<path:filename>")
+@app.route("/admin/export")
 @login_required
-def download_pdf(filename):
-    return send_file(filename, as_attachment=True)
+def export_history():
+    user = get_current_user()
+    if user["tier"] != "paid3":
+        return "Unauthorized", 403
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORT_FORMATS:
+        return "Invalid format", 400
+    try:
+        filters = parse_export_filters(request.args.get("since"), request.args.get("until"),
+                                       request.args.get("tier"), request.args.get("email"))
+    except ValueError as e:
+        return str(e), 400
+    filename = f"history_{datetime.now().strftime('%Y%m%d%H%M%S')}.{fmt}"
+    if fmt == "csv":
+        return app.response_class(stream_with_context(iter_history_csv(iter_export_rows(**filters))),
+                                  mimetype="text/csv",
+                                  headers={"Content-Disposition": f"attachment; filename={filename}"})
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        if fmt == "npz":
+            write_history_npz(path, **filters)
+        else:
+            write_history_parquet(path, **filters)
+    except ImportError:
+        os.remove(path)
+        return "Parquet export requires pyarrow", 501
+    # Fisierul ramane accesibil prin descriptorul deschis; dispare de pe disc imediat.
+    export_file = open(path, "rb")
+    os.remove(path)
+    return send_file(export_file, as_attachment=True, download_name=filename)
+
+@app.route("/admin/usage")
+@login_required
+def usage():
+    user = get_current_user()
+    if user["tier"] != "paid3":
+        return "Unauthorized", 403
+    try:
+        days = int(request.args.get("days", 30))
+    except ValueError:
+        return "Invalid days", 400
+    return render_template("usage.html", user=user, tiers=TIERS, days=days, summary=summarize_usage(days))
+
+@app.route("/admin/profiling", methods=["GET", "POST"])
+@login_required
+def profiling():
+    user = get_current_user()
+    if user["tier"] != "paid3":
+        return "Unauthorized", 403
+    if request.method == "POST":
+        try:
+            sample_rate = float(request.form.get("sample_rate", 0))
+            next_requests = int(request.form.get("next_requests", 0))
+        except ValueError:
+            return "Invalid value", 400
+        # float() accepta "nan"/"inf"; NaN trece de min/max si ar profila fiecare request.
+        if not math.isfinite(sample_rate):
+            return "Invalid value", 400
+        with file_lock(profiling_file):
+            settings = load_profiling_settings()
+            settings["sample_rate"] = min(max(sample_rate, 0.0), 1.0)
+            if next_requests > 0:
+                settings.setdefault("users", {})[user["email"]] = next_requests
+            else:
+                settings.setdefault("users", {}).pop(user["email"], None)
+            save_profiling_settings(settings)
+        return redirect(url_for("profiling"))
+    profiles = [p for p in (load_profile(pid) for pid in list_profile_ids()) if p]
+    return render_template("profiling.html", user=user, tiers=TIERS, settings=load_profiling_settings(), profiles=profiles)
+
+@app.route("/admin/profiling/<profile_id>")
+@login_required
+def profile_detail(profile_id):
+    user = get_current_user()
+    if user["tier"] != "paid3":
+        return "Unauthorized", 403
+    profile = load_profile(profile_id)
+    if profile is None:
+        return "Not found", 404
+    rects, depth = flamegraph_rects(profile["samples"])
+    top = Counter()
+    for stack, count in profile["samples"].items():
+        top[stack.rsplit(";", 1)[-1]] += count
+    return render_template("profiling.html", user=user, tiers=TIERS, profile=profile, rects=rects, depth=depth,
+                           total_samples=sum(profile["samples"].values()), top_frames=top.most_common(15))
+
+@app.route("/admin/profiling/<profile_id>.folded")
+@login_required
+def profile_folded(profile_id):
+    user = get_current_user()
+    if user["tier"] != "paid3":
+        return "Unauthorized", 403
+    profile = load_profile(profile_id)
+    if profile is None:
+        return "Not found", 404
+    lines = [f"{stack} {count}" for stack, count in sorted(profile["samples"].items())]
+    return app.response_class("\n".join(lines) + "\n", mimetype="text/plain",
+                              headers={"Content-Disposition": f"attachment; filename={profile_id}.folded"})
+
+# Descarcari de artefacte (PDF-uri) prin URL-uri semnate, de scurta durata, legate de
+# proprietar si de fisier. Verificarea e O(1): semnatura + email-ul din sesiune, fara
+# istoricul. Fisierul e servit de send_file (Range, ETag/304, wsgi.file_wrapper, adica
+# os.sendfile sub gunicorn) sau predat proxy-ului din fata prin ARTIFACT_SENDFILE:
+#   x-accel   -> X-Accel-Redirect: ARTIFACT_ACCEL_PREFIX/<fisier>   (nginx, location internal)
+#   x-sendfile -> X-Sendfile: <cale absoluta>                       (Apache, lighttpd)
+ARTIFACT_TOKEN_MAX_AGE = int(os.environ.get("ARTIFACT_TOKEN_MAX_AGE", 15 * 60))
+ARTIFACT_SENDFILE = os.environ.get("ARTIFACT_SENDFILE", "")
+ARTIFACT_ACCEL_PREFIX = os.environ.get("ARTIFACT_ACCEL_PREFIX", "/protected/pdf")
+app.use_x_sendfile = ARTIFACT_SENDFILE == "x-sendfile"
+
+def artifact_serializer():
+    return URLSafeTimedSerializer(app.secret_key, salt="artifact-download")
+
+def artifact_url(email, path):
+    token = artifact_serializer().dumps({"u": email, "f": os.path.basename(path)})
+    return url_for("download_artifact", token=token)
+
+@app.route("/history/<timestamp>/pdf")
+@login_required
+def history_pdf(timestamp):
+    """Referinta stabila la PDF-ul unei analize a userului: la fiecare click emite un token nou,
+    de scurta durata, si redirectioneaza catre descarcarea semnata."""
+    email = session["user_email"]
+    for entry in iter_history():
+        if entry.get("email") == email and entry.get("timestamp") == timestamp and entry.get("pdf"):
+            return redirect(artifact_url(email, entry["pdf"]))
+    return "Not found", 404
+
+@app.route("/history/<timestamp>/text")
+@login_required
+def history_text(timestamp):
+    """Textul complet al unui draft mai vechi, reconstituit din lantul de delte din istoric."""
+    text = get_history_text(session["user_email"], timestamp)
+    if text is None:
+        return "Not found", 404
+    name = f"discurs_{re.sub(r'[^0-9]', '', timestamp)[:14]}.txt"
+    return app.response_class(text, mimetype="text/plain",
+                              headers={"Content-Disposition": f"attachment; filename={name}"})
+
+@app.route("/artifacts/<token>")
+@login_required
+def download_artifact(token):
+    try:
+        claims = artifact_serializer().loads(token, max_age=ARTIFACT_TOKEN_MAX_AGE)
+    except SignatureExpired:
+        return "Link expirat. Descarca PDF-ul din nou din pagina Istoric (/history), care emite un link nou.", 410
+    except BadSignature:
+        return "Not found", 404
+    name = os.path.basename(claims.get("f", ""))
+    if claims.get("u") != session["user_email"] or not name:
+        return "Not found", 404
+    path = os.path.abspath(os.path.join(pdf_folder, name))
+    if not os.path.isfile(path):
+        return "Not found", 404
+    if ARTIFACT_SENDFILE == "x-accel":
+        response = app.response_class(mimetype="application/pdf")
+        response.headers["X-Accel-Redirect"] = f"{ARTIFACT_ACCEL_PREFIX}/{name}"
+        response.headers["Content-Disposition"] = f"attachment; filename={name}"
+        return response
+    response = send_file(path, mimetype="application/pdf", as_attachment=True, download_name=name,
+                         conditional=True, etag=True, max_age=ARTIFACT_TOKEN_MAX_AGE)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+# Asset-uri statice servite din memorie: ETag puternic, URL cu amprenta si
+# variante gzip/brotli pregatite o singura data, la pornire.
+# "paths": locurile in care poate sta fisierul, relativ la app.root_path; primul gasit castiga.
+# In repo, manifestul si service worker-ul sunt livrate sub templates/static/.
+ASSET_FILES = {
+    "icon-192.png":      {"paths": ["icon-192.png", "templates/static/icon-192.png"],
+                          "url": "/icon-192.png", "mimetype": "image/png"},
+    "icon-512.png":      {"paths": ["icon-512.png", "templates/static/icon-512.png"],
+                          "url": "/icon-512.png", "mimetype": "image/png"},
+    "manifest.json":     {"paths": ["static/manifest.json", "templates/static/manifest.json",
+                                    "templates/static/manifest.json \u2192"],
+                          "url": "/static/manifest.json", "mimetype": "application/manifest+json"},
+    "service-worker.js": {"paths": ["static/service-worker.js", "templates/static/static/service-worker.js"],
+                          "url": "/service-worker.js", "mimetype": "application/javascript"},
+}
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+MIN_COMPRESS_SIZE = 512
+ASSETS = {}
+
+def compress_variants(raw, level=9):
+    """Returneaza {encoding: bytes} doar cu variantele care chiar economisesc octeti."""
+    variants = {"identity": raw}
+    if len(raw) < MIN_COMPRESS_SIZE:
+        return variants
+    gz = gzip.compress(raw, compresslevel=level, mtime=0)
+    if len(gz) < len(raw) * 0.9:
+        variants["gzip"] = gz
+    if brotli is not None:
+        br = brotli.compress(raw, quality=11 if level >= 9 else 5)
+        if len(br) < len(raw) * 0.9:
+            variants["br"] = br
+    return variants
+
+def register_asset(name, raw, mimetype, fingerprinted=True):
+    digest = hashlib.sha256(raw).hexdigest()
+    ASSETS[name] = {
+        "etag": digest[:32],
+        "url": f"/assets/{digest[:12]}/{name}" if fingerprinted else ASSET_FILES[name]["url"],
+        "mimetype": mimetype,
+        "variants": compress_variants(raw),
+    }
+
+def asset_source_path(name):
+    """Calea absoluta a fisierului sursa al unui asset, sau None daca lipseste."""
+    for candidate in ASSET_FILES[name]["paths"]:
+        path = os.path.join(app.root_path, candidate)
+        if os.path.exists(path):
+            return path
+    return None
+
+def build_asset_table():
+    """Citeste asset-urile, rescrie referintele catre URL-urile cu amprenta si precomprima."""
+    ASSETS.clear()
+    for name in ("icon-192.png", "icon-512.png"):
+        path = asset_source_path(name)
+        if path:
+            with open(path, "rb") as f:
+                register_asset(name, f.read(), ASSET_FILES[name]["mimetype"])
+    manifest_path = asset_source_path("manifest.json")
+    if manifest_path:
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+        for icon in manifest.get("icons", []):
+            icon["src"] = asset_url(icon.get("src", "").lstrip("/"))
+        raw = json.dumps(manifest, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        register_asset("manifest.json", raw, ASSET_FILES["manifest.json"]["mimetype"])
+    sw_path = asset_source_path("service-worker.js")
+    if sw_path:
+        with open(sw_path, encoding="utf-8") as f:
+            source = f.read()
+        fingerprinted = sorted(a["url"] for a in ASSETS.values())
+        version = hashlib.sha256("".join(fingerprinted).encode()).hexdigest()[:12]
+        asset_manifest = json.dumps({"version": version, "assets": fingerprinted})
+        lines = [f"const ASSET_MANIFEST = {asset_manifest};" if l.startswith("const ASSET_MANIFEST =") else l
+                 for l in source.split("\n")]
+        register_asset("service-worker.js", "\n".join(lines).encode("utf-8"),
+                       ASSET_FILES["service-worker.js"]["mimetype"], fingerprinted=False)
+
+def asset_url(name):
+    if name in ASSETS:
+        return ASSETS[name]["url"]
+    spec = ASSET_FILES.get(name)
+    return spec["url"] if spec else "/" + name
+
+def negotiate_encoding(variants):
+    for encoding in ("br", "gzip"):
+        if encoding in variants and request.accept_encodings[encoding]:
+            return encoding
+    return "identity"
+
+def send_variant(variants, etag, mimetype, cache_control):
+    """Raspuns conditional (304 la ETag identic) cu varianta comprimata potrivita clientului."""
+    encoding = negotiate_encoding(variants)
+    tag = etag if encoding == "identity" else f"{etag}-{encoding}"
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if request.if_none_match.contains(tag):
+        response = app.response_class(status=304, headers=headers)
+        response.set_etag(tag)
+        return response
+    response = app.response_class(variants[encoding], mimetype=mimetype, headers=headers)
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.set_etag(tag)
+    return response
+
+def send_asset(name, cache_control):
+    asset = ASSETS.get(name)
+    if asset is None:
+        print(f"Asset missing: {name} (cautat in {', '.join(ASSET_FILES[name]['paths'])})")
+        return "Not found", 404
+    return send_variant(asset["variants"], asset["etag"], asset["mimetype"], cache_control)
+
+build_asset_table()
+
+@app.context_processor
+def inject_asset_url():
+    return {"asset_url": asset_url}
+
+PAGE_MANAGED_HEADERS = {"Content-Type", "Content-Length", "Content-Encoding", "ETag", "Vary", "Cache-Control"}
+
+@app.after_request
+def optimize_page_response(response):
+    """Paginile HTML: ETag + GET conditional si compresie on-the-fly."""
+    if (request.method != "GET" or response.status_code != 200 or response.direct_passthrough
+            or response.mimetype != "text/html" or "Content-Encoding" in response.headers):
+        return response
+    body = response.get_data()
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    page = send_variant(compress_variants(body, level=6), etag, "text/html",
+                        response.headers.get("Cache-Control", "private, no-cache"))
+    page.headers["Vary"] = "Accept-Encoding, Cookie"
+    # Headerele setate de view (Set-Cookie, CSP etc.) trec pe raspunsul nou.
+    for key, value in response.headers.items():
+        if key not in PAGE_MANAGED_HEADERS:
+            page.headers.add(key, value)
+    return page
+
+@app.route("/assets/<fingerprint>/<name>")
+def serve_asset(fingerprint, name):
+    asset = ASSETS.get(name)
+    if asset is None or asset["url"] != f"/assets/{fingerprint}/{name}":
+        return "Not found", 404
+    return send_asset(name, IMMUTABLE_CACHE)
 
 @app.route('/icon-192.png')
 def serve_icon_192():
-    return send_file('icon-192.png')
+    return send_asset("icon-192.png", REVALIDATE_CACHE)
 
 @app.route('/icon-512.png')
 def serve_icon_512():
-    return send_file('icon-512.png')
+    return send_asset("icon-512.png", REVALIDATE_CACHE)
 
 @app.route('/service-worker.js')
 def service_worker():
-    return send_file('static/service-worker.js'), 200, {'Content-Type': 'application/javascript'}
+    return send_asset("service-worker.js", REVALIDATE_CACHE)
+
+@app.cli.command("export-history")
+@click.option("--format", "fmt", type=click.Choice(EXPORT_FORMATS), default="csv")
+@click.option("--output", "-o", default="-", help="Fisierul de iesire; '-' = stdout (doar csv).")
+@click.option("--since", help="Data de inceput, YYYY-MM-DD.")
+@click.option("--until", help="Data de sfarsit, YYYY-MM-DD.")
+@click.option("--tier", type=click.Choice(list(TIERS)))
+@click.option("--email", help="Doar analizele acestui utilizator.")
+def export_history_command(fmt, output, since, until, tier, email):
+    """Exporta istoricul analizelor (flask --app app export-history -o history.csv)."""
+    try:
+        filters = parse_export_filters(since, until, tier, email)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    if fmt == "csv":
+        with click.open_file(output, "w", encoding="utf-8") as f:
+            for chunk in iter_history_csv(iter_export_rows(**filters)):
+                f.write(chunk)
+        return
+    if output == "-":
+        raise click.BadParameter("npz/parquet need --output", param_hint="--output")
+    count = write_history_npz(output, **filters) if fmt == "npz" else write_history_parquet(output, **filters)
+    click.echo(f"{count} analize exportate in {output}", err=True)
+
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Reconstruieste indexul de cautare din istoric (flask --app app rebuild-search-index)."""
+    started = time.perf_counter()
+    count = rebuild_search_index()
+    click.echo(f"{count} analize indexate in {time.perf_counter() - started:.1f}s", err=True)
+
+@app.cli.command("compact-history")
+def compact_history_command():
+    """Converteste intrarile vechi (cu "result" in clar) in formatul compact."""
+    with file_lock(history_file):
+        data = load_history()
+        converted = 0
+        for i, entry in enumerate(data):
+            if "result" in entry:
+                compact = {k: v for k, v in entry.items() if k != "result"}
+                compact.update({"codec": HISTORY_CODEC, "text_depth": 0,
+                                "z": encode_history_blob({"result": entry["result"], "text": None})})
+                data[i] = compact
+                converted += 1
+        before = os.path.getsize(history_file) if os.path.exists(history_file) else 0
+        tmp_path = f"{history_file}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, history_file)
+    click.echo(f"{converted} intrari convertite; {before} -> {os.path.getsize(history_file)} bytes", err=True)
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 10000)))
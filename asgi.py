@@ -0,0 +1,17 @@
+"""Punct de intrare ASGI: acelasi app Flask, servit in modul async.
+
+    uvicorn asgi:application --port 10000
+    gunicorn -c gunicorn_asgi.conf.py asgi:application
+
+Cererile ruleaza intr-un pool de ASGI_THREADS thread-uri; apelurile catre OpenAI trec
+prin loop-ul async al procesului (vezi ASYNC_MODE in app.py).
+"""
+import os
+
+os.environ.setdefault("SPEAKERLAB_ASYNC", "1")
+
+from a2wsgi import WSGIMiddleware  # noqa: E402
+
+from app import app  # noqa: E402
+
+application = WSGIMiddleware(app, workers=int(os.environ.get("ASGI_THREADS", 64)))
@@ -0,0 +1,322 @@
+"""Micro-benchmark-uri pentru caile fierbinti din app.py (scoruri, istoric, grafic, PDF).
+
+    python benchmarks.py                          # ruleaza tot, afiseaza tabelul
+    python benchmarks.py --save baseline.json     # salveaza rezultatele ca baseline
+    python benchmarks.py --compare baseline.json  # iese cu cod 1 la regresii > --threshold
+    python benchmarks.py -k history --sizes 1000  # doar benchmark-urile care contin "history"
+
+Ruleaza offline: datele sunt sintetice, fisierele de istoric si PDF-urile se scriu
+intr-un director temporar, iar OpenAI nu este apelat.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import app  # noqa: E402
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_THRESHOLD = 0.20
+TIER_NAMES = ("free", "paid1", "paid2", "paid3")
+SAMPLE_SENTENCES = [
+    "Cand aveam sapte ani, bunicul m-a dus pentru prima data la spitalul din Brasov.",
+    "Am inteles atunci ca frica nu dispare, doar invatam sa mergem alaturi de ea.",
+    "Va rog sa inchideti ochii si sa va imaginati mirosul de paine calda din copilarie.",
+    "Statisticile spun ca doi din trei romani nu au vorbit niciodata in public.",
+    "Am esuat de trei ori inainte sa inteleg ce inseamna cu adevarat sa asculti.",
+    "Ideea mea este simpla: curiozitatea este un muschi care se antreneaza zilnic.",
+]
+
+# ---------- date sintetice ----------
+
+def make_speech(rng, words=600):
+    text = []
+    while sum(len(s.split()) for s in text) < words:
+        text.append(rng.choice(SAMPLE_SENTENCES))
+    return " ".join(text)
+
+
+def make_archetype(rng, tier):
+    name = rng.choice(list(app.ARCHETYPES))
+    data = app.ARCHETYPES[name]
+    arch = {
+        "primary": name, "secondary": rng.choice(list(app.ARCHETYPES)), "emoji": data["emoji"],
+        "group": data["group"], "desire": data["desire"], "fear": data["fear"],
+        "evidence": rng.choice(SAMPLE_SENTENCES), "archetype_authenticity_score": rng.randint(3, 9),
+    }
+    if tier == "paid2":
+        arch["coaching_note"] = " ".join(rng.sample(SAMPLE_SENTENCES, 2))
+    else:
+        arch.update({"confidence": "medie", "superpower": data["superpower"],
+                     "shadow_present": "Nu", "archetype_authenticity_note": rng.choice(SAMPLE_SENTENCES)})
+    if tier == "paid3":
+        arch.update({"curator_message_about_archetype": " ".join(rng.sample(SAMPLE_SENTENCES, 3)),
+                     "ted_example": data["ted_example"], "shadow": data["shadow"]})
+    return arch
+
+
+def make_result(tier, rng):
+    """Un rezultat cu aceeasi forma ca raspunsul modelului pentru tier-ul dat."""
+    note = lambda: " ".join(rng.sample(SAMPLE_SENTENCES, 2))
+    questions = lambda: [f"{s[:-1]}?" for s in rng.sample(SAMPLE_SENTENCES, 3)]
+    if tier == "free":
+        analysis = {k: {"score": rng.randint(1, 10), "recommendation": note()} for k in app.FREE_CRITERIA}
+    elif tier == "paid1":
+        analysis = {"archetype": make_archetype(rng, tier)}
+        for k in app.GALLO_PRINCIPLES:
+            analysis[k] = {"score": rng.randint(1, 10), "present": rng.random() > 0.3, "recommendation": note()}
+        analysis["Autenticitate"] = {"score": rng.randint(1, 10), "present": True, "reflection_questions": questions()}
+    elif tier == "paid2":
+        analysis = {
+            "archetype": make_archetype(rng, tier), "overall_score": rng.randint(3, 9), "summary": note(),
+            "strengths": rng.sample(SAMPLE_SENTENCES, 3), "next_steps": rng.sample(SAMPLE_SENTENCES, 3),
+            "coaching_sessions": [
+                {"day": i + 1, "principle": k, "status": "partial", "score": rng.randint(1, 10),
+                 "text_evidence": rng.choice(SAMPLE_SENTENCES), "exercise": note(),
+                 "example_question": questions()[0], "ted_example": "Puterea introvertitilor",
+                 "ted_speaker": "Susan Cain"}
+                for i, k in enumerate(app.GALLO_PRINCIPLES)
+            ],
+        }
+    else:
+        principles = {k: {"score": rng.randint(1, 10), "curator_note": note()} for k in app.GALLO_PRINCIPLES}
+        principles["Autenticitate"] = {"score": rng.randint(1, 10), "reflection_questions": questions()}
+        analysis = {
+            "archetype": make_archetype(rng, tier), "curator_message": note(), "overall_score": rng.randint(3, 9),
+            "curator_verdict": "Aproape gata", "what_moved_me": note(), "what_worries_me": note(),
+            "nine_principles_check": principles,
+            "stage_readiness": {"ready_to_present": False, "estimated_sessions_needed": 3,
+                                "priority_action": rng.choice(SAMPLE_SENTENCES)},
+        }
+    return {"tier": tier, "analysis": analysis}
+
+
+def revise_speech(rng, text, edits=3):
+    """Un draft nou al aceluiasi discurs: cateva propozitii schimbate, adaugate sau scoase."""
+    sentences = text.split(". ")
+    for _ in range(edits):
+        i = rng.randrange(len(sentences))
+        op = rng.random()
+        if op < 0.5:
+            sentences[i] = f"{rng.choice(SAMPLE_SENTENCES)[:-1]} in {rng.randint(1990, 2025)}"
+        elif op < 0.8:
+            sentences.insert(i, rng.choice(SAMPLE_SENTENCES)[:-1])
+        elif len(sentences) > 3:
+            sentences.pop(i)
+    return ". ".join(sentences)
+
+
+def make_history(size, rng, users=50, legacy=False):
+    """size intrari de istoric, in ordine cronologica, impartite intre `users` utilizatori.
+
+    Fiecare speaker trimite serii de 5-10 drafturi apropiate ale aceluiasi discurs.
+    Cu legacy=True intrarile au vechiul format, cu "result" in clar si fara text complet.
+    """
+    start = datetime(2025, 1, 1)
+    entries = []
+    drafts = {}  # email -> (text, text_depth, drafturi ramase in serie)
+    for i in range(size):
+        tier = TIER_NAMES[i % len(TIER_NAMES)]
+        email = f"speaker{i % users}@example.ro"
+        result = make_result(tier, rng)
+        total, max_score = app.calculate_total_score(result)
+        previous_text, depth, remaining = drafts.get(email, (None, 0, 0))
+        if remaining:
+            text = revise_speech(rng, previous_text)
+        else:
+            text, remaining = make_speech(rng, words=rng.randint(400, 900)), rng.randint(5, 10)
+        if legacy:
+            entry = {
+                "timestamp": None, "email": email,
+                "text_preview": text[:200] + "..." if len(text) > 200 else text,
+                "tier": tier, "total_score": total, "max_score": max_score, "result": result,
+            }
+        else:
+            entry = app.make_history_entry(email, text, result, total, max_score, previous_text, depth)
+        entry["timestamp"] = (start + timedelta(minutes=17 * i)).isoformat()
+        drafts[email] = (text, entry.get("text_depth", 0), remaining - 1)
+        entries.append(entry)
+    return entries
+
+# ---------- executie ----------
+
+class Benchmark:
+    """Apelabil in stilul fixture-ului pytest-benchmark: benchmark(fn, *args)."""
+
+    def __init__(self, min_rounds=5, max_time=2.0):
+        self.min_rounds = min_rounds
+        self.max_time = max_time
+        self.stats = None
+
+    def __call__(self, fn, *args, **kwargs):
+        fn(*args, **kwargs)
+        timings = []
+        deadline = time.perf_counter() + self.max_time
+        while len(timings) < self.min_rounds or time.perf_counter() < deadline:
+            t = time.perf_counter()
+            result = fn(*args, **kwargs)
+            timings.append(time.perf_counter() - t)
+            if len(timings) >= 1000:
+                break
+        self.stats = {
+            "min": min(timings), "median": statistics.median(timings), "mean": statistics.fmean(timings),
+            "stddev": statistics.pstdev(timings), "rounds": len(timings),
+        }
+        return result
+
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS.append((name, fn))
+        return fn
+    return register
+
+
+def register_all(sizes, workdir):
+    rng = random.Random(2024)
+    results = {tier: make_result(tier, rng) for tier in TIER_NAMES}
+
+    for tier in TIER_NAMES:
+        benchmark(f"calculate_total_score[{tier}]")(
+            lambda b, r=results[tier]: b(app.calculate_total_score, r))
+    benchmark("get_score_label")(
+        lambda b: b(lambda: [app.get_score_label(t, 100) for t in range(0, 101, 5)]))
+    benchmark("format_case_studies_for_prompt")(lambda b: b(app.format_case_studies_for_prompt))
+
+    for size in sizes:
+        path = os.path.join(workdir, f"history_{size}.json")
+
+        def setup(path=path, size=size):
+            if not os.path.exists(path):
+                with open(path, "w") as f:
+                    json.dump(make_history(size, random.Random(size)), f, ensure_ascii=False, separators=(",", ":"))
+            app.history_file = path
+            app.search_db_file = os.path.join(workdir, f"search_{size}.sqlite3")
+
+        def bench_load(b, setup=setup):
+            setup()
+            b(app.load_history)
+
+        def bench_save(b, setup=setup, size=size):
+            setup()
+            text = make_speech(random.Random(size))
+            b(app.save_history, "speaker1@example.ro", text, results["paid3"], 60, 100)
+
+        def bench_user_history(b, setup=setup):
+            setup()
+            b(app.get_user_history, "speaker7@example.ro", 20)
+
+        def bench_search(b, setup=setup, query="spitalul Brasov", **filters):
+            setup()
+            app.ensure_search_index()
+            b(app.search_history, "speaker7@example.ro", query, **filters)
+
+        def bench_previous_score(b, setup=setup):
+            setup()
+            b(app.get_previous_score, "speaker7@example.ro", datetime.now().isoformat())
+
+        benchmark(f"load_history[{size}]")(bench_load)
+        benchmark(f"get_user_history[{size}]")(bench_user_history)
+        benchmark(f"get_previous_score[{size}]")(bench_previous_score)
+        benchmark(f"search_history[{size}]")(bench_search)
+        benchmark(f"search_history_facets[{size}]")(
+            lambda b, bench=bench_search: bench(b, query="curiozitatea", tier="paid3", min_score=50))
+        benchmark(f"save_history[{size}]")(bench_save)  # ultimul: adauga intrari in fisier
+
+    scores = app.extract_scores(results["paid3"]["analysis"], "paid3")
+    benchmark("generate_radar_image")(
+        lambda b: b(app.generate_radar_image, scores, os.path.join(workdir, "radar.png")))
+    speech = make_speech(rng)
+
+    def bench_pdf(b, tier, core_fonts):
+        """Fontul Unicode cache-uit vs. Arial (PDF_CORE_FONTS); noteaza si marimea fisierului."""
+        total, max_score = app.calculate_total_score(results[tier])
+        previous, app.PDF_CORE_FONTS = app.PDF_CORE_FONTS, core_fonts
+        try:
+            path = b(app.generate_pdf, speech, results[tier], "Ana Ștefănescu", tier, total, max_score)
+        finally:
+            app.PDF_CORE_FONTS = previous
+        b.stats["bytes"] = os.path.getsize(path)
+
+    for tier in TIER_NAMES:
+        benchmark(f"generate_pdf[{tier}]")(lambda b, tier=tier: bench_pdf(b, tier, False))
+        benchmark(f"generate_pdf_core_fonts[{tier}]")(lambda b, tier=tier: bench_pdf(b, tier, True))
+
+
+def run(selected, min_rounds, max_time):
+    report = {}
+    for name, fn in selected:
+        b = Benchmark(min_rounds=min_rounds, max_time=max_time)
+        fn(b)
+        report[name] = b.stats
+        s = b.stats
+        size = f"   {s['bytes']} bytes" if "bytes" in s else ""
+        print(f"{name:38s} median {s['median'] * 1000:10.3f} ms   min {s['min'] * 1000:10.3f} ms   rounds {s['rounds']}{size}")
+    return report
+
+
+def compare(report, baseline, threshold):
+    """Returneaza lista de regresii: mediana curenta > mediana baseline * (1 + threshold)."""
+    regressions = []
+    print(f"\nComparatie cu baseline (prag {threshold:.0%}):")
+    for name, stats in report.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            print(f"  {name:38s} (nou)")
+            continue
+        change = stats["median"] / old["median"] - 1 if old["median"] else 0.0
+        flag = "REGRESIE" if change > threshold else ""
+        print(f"  {name:38s} {change:+8.1%} {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-k", dest="keyword", help="ruleaza doar benchmark-urile care contin acest text")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="dimensiunile istoricului, separate prin virgula")
+    parser.add_argument("--min-rounds", type=int, default=5)
+    parser.add_argument("--max-time", type=float, default=2.0, help="secunde per benchmark")
+    parser.add_argument("--save", metavar="FILE", help="scrie rezultatele JSON in FILE")
+    parser.add_argument("--compare", metavar="FILE", help="compara cu un baseline JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    with tempfile.TemporaryDirectory() as workdir:
+        app.pdf_folder = os.path.join(workdir, "pdf")
+        register_all(sizes, workdir)
+        selected = [(n, fn) for n, fn in BENCHMARKS if not args.keyword or args.keyword in n]
+        report = run(selected, args.min_rounds, args.max_time)
+
+    output = {
+        "meta": {"created": datetime.now().isoformat(), "python": platform.python_version(),
+                 "platform": platform.platform(), "sizes": sizes},
+        "results": report,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(output, f, indent=2)
+        print(f"\nRezultate salvate in {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
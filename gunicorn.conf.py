@@ -0,0 +1,21 @@
+# Configuratie gunicorn: gunicorn -c gunicorn.conf.py app:app
+#
+# preload_app importa app.py o singura data, in master. when_ready incarca
+# apoi matplotlib/numpy/fpdf/openai tot in master, inainte de fork, asa ca
+# workerii pornesc imediat si impart paginile de memorie (copy-on-write).
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "sync"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+preload_app = True
+max_requests = 1000
+max_requests_jitter = 100
+
+
+def when_ready(server):
+    import app
+    app.preload_heavy_modules()
+    server.log.info("Speaker Lab: heavy modules preloaded in master (pid %s)", os.getpid())
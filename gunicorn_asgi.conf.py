@@ -0,0 +1,20 @@
+# Configuratie gunicorn pentru modul async: gunicorn -c gunicorn_asgi.conf.py asgi:application
+#
+# Un worker uvicorn tine zeci de analize in zbor: cererile asteapta modelul in thread-uri
+# ieftine, nu in procese. De aceea ajung putini workeri (implicit 2), fiecare cu
+# PDF_WORKERS procese pentru randarea PDF-urilor.
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 10000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+worker_class = "uvicorn_worker.UvicornWorker"
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+raw_env = ["SPEAKERLAB_ASYNC=1"]
+max_requests = 1000
+max_requests_jitter = 100
+
+
+def post_worker_init(worker):
+    import app
+    app.start_async_runtime()
+    worker.log.info("Speaker Lab: async runtime ready (pid %s, %s PDF workers)", os.getpid(), app.PDF_WORKERS)
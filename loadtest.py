@@ -0,0 +1,338 @@
+"""Test de incarcare: deployment-ul sync (gunicorn) vs. cel async (asgi.py), cu OpenAI simulat.
+
+    python loadtest.py stub --port 9100                      # doar serverul OpenAI simulat
+    python loadtest.py run --mode sync --workers 3           # un deployment, un raport
+    python loadtest.py compare --users 50 --rounds 3         # sync vs. async, acelasi scenariu
+    python loadtest.py fanout --runs 40                      # paid3: apel unic vs. fan-out
+    python loadtest.py latency --usage data/usage.jsonl      # p50/p95 din log-urile reale
+
+Serverul simulat raspunde la /v1/chat/completions cu un JSON de forma ceruta de prompt,
+dupa o latenta de STUB_BASE_LATENCY + tokeni_generati / STUB_TOKENS_PER_SEC (cu pana la
+STUB_JITTER in plus), ca un model care genereaza serial. Aplicatia ruleaza intr-un director temporar, cu date proprii.
+"""
+import argparse
+import asyncio
+import http.cookiejar
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from datetime import datetime
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-loadtest")
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+import app  # noqa: E402
+import benchmarks  # noqa: E402
+
+STUB_BASE_LATENCY = float(os.environ.get("STUB_BASE_LATENCY", 0.4))
+STUB_TOKENS_PER_SEC = float(os.environ.get("STUB_TOKENS_PER_SEC", 150))
+STUB_JITTER = float(os.environ.get("STUB_JITTER", 0.3))
+PASSWORD = "loadtest-parola"
+
+# ---------- server OpenAI simulat ----------
+
+def stub_tier(prompt):
+    if any(key in prompt for key in ("nine_principles_check", "curator_verdict", "curator_message_about_archetype")):
+        return "paid3"
+    if "coaching_sessions" in prompt:
+        return "paid2"
+    if "Idea Strength" in prompt:
+        return "free"
+    return "paid1"
+
+
+def stub_analysis(prompt, rng):
+    """Analiza sintetica a tier-ului; pentru paid3 doar cheile din schema ceruta (fan-out)."""
+    tier = stub_tier(prompt)
+    analysis = benchmarks.make_result(tier, rng)["analysis"]
+    if tier != "paid3":
+        return analysis
+    schema = prompt.rsplit("Returneaza DOAR", 1)[-1].split("Text de analizat:")[0]
+    picked = {k: v for k, v in analysis.items() if f'"{k}"' in schema}
+    if "nine_principles_check" in picked:
+        picked["nine_principles_check"] = {k: v for k, v in picked["nine_principles_check"].items()
+                                           if f'"{k}"' in schema}
+    return picked
+
+
+def stub_completion(body, rng):
+    prompt = body["messages"][-1]["content"]
+    content = json.dumps(stub_analysis(prompt, rng), ensure_ascii=False)
+    completion_tokens = len(content) // 4
+    finish_reason = "stop"
+    if body.get("max_tokens") and completion_tokens > body["max_tokens"]:
+        completion_tokens, finish_reason = body["max_tokens"], "length"
+        content = content[:completion_tokens * 4]
+    return completion_tokens, {
+        "id": f"chatcmpl-stub{rng.randrange(10 ** 9)}", "object": "chat.completion",
+        "created": int(time.time()), "model": body.get("model", "stub"),
+        "choices": [{"index": 0, "finish_reason": finish_reason,
+                     "message": {"role": "assistant", "content": content}}],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": completion_tokens,
+                  "total_tokens": len(prompt) // 4 + completion_tokens},
+    }
+
+
+def make_stub_app():
+    rng = random.Random(7)
+
+    async def stub_app(scope, receive, send):
+        if scope["type"] != "http":
+            return
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        if not scope["path"].endswith("/chat/completions"):
+            await send({"type": "http.response.start", "status": 404, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        tokens, payload = stub_completion(json.loads(body), rng)
+        await asyncio.sleep((STUB_BASE_LATENCY + tokens / STUB_TOKENS_PER_SEC) * (1 + rng.random() * STUB_JITTER))
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": json.dumps(payload).encode("utf-8")})
+
+    return stub_app
+
+
+def start_stub(port):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(make_stub_app(), port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+# ---------- deployment-uri ----------
+
+def tree_rss_mb(pid):
+    """RSS-ul total al procesului si al tuturor descendentilor lui, din /proc."""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            pass
+    return total / 1024
+
+
+def start_deployment(mode, workers, port, stub_port, workdir):
+    if mode == "sync":
+        cmd = [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"), "app:app"]
+    else:
+        cmd = [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "gunicorn_asgi.conf.py"), "asgi:application"]
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), PYTHONPATH=ROOT,
+               OPENAI_BASE_URL=f"http://127.0.0.1:{stub_port}/v1")
+    proc = subprocess.Popen(cmd, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/login", timeout=2).read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"deployment-ul {mode} nu a pornit pe portul {port}")
+
+
+def write_users(workdir, count, tier):
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    users = {f"load{i}@example.ro": {"password": app.hash_password(PASSWORD), "name": f"Load {i}",
+                                     "tier": tier, "created": datetime.now().isoformat()}
+             for i in range(count)}
+    with open(os.path.join(workdir, "data", "users.json"), "w") as f:
+        json.dump(users, f)
+    return list(users)
+
+# ---------- generator de trafic ----------
+
+def speaker_session(base_url, email, rounds, rng, latencies, errors):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+    login = urllib.parse.urlencode({"email": email, "password": PASSWORD}).encode()
+    opener.open(f"{base_url}/login", login, timeout=30).read()
+    text = benchmarks.make_speech(rng, words=500)
+    for _ in range(rounds):
+        text = benchmarks.revise_speech(rng, text)
+        start = time.perf_counter()
+        try:
+            page = opener.open(f"{base_url}/", urllib.parse.urlencode({"speech_text": text}).encode(),
+                               timeout=300).read()
+            if b"/artifacts/" not in page:
+                raise ValueError("raspuns fara scorecard PDF")
+            latencies.append(time.perf_counter() - start)
+        except (OSError, ValueError) as e:
+            errors.append(str(e))
+
+
+def run_load(mode, workers, users, rounds, tier, port, stub_port):
+    with tempfile.TemporaryDirectory() as workdir:
+        emails = write_users(workdir, users, tier)
+        proc = start_deployment(mode, workers, port, stub_port, workdir)
+        try:
+            idle_mb = tree_rss_mb(proc.pid)
+            latencies, errors, peak = [], [], [idle_mb]
+            threads = [threading.Thread(target=speaker_session,
+                                        args=(f"http://127.0.0.1:{port}", email, rounds,
+                                              random.Random(i), latencies, errors))
+                       for i, email in enumerate(emails)]
+            start = time.perf_counter()
+            for t in threads:
+                t.start()
+            while any(t.is_alive() for t in threads):
+                peak.append(tree_rss_mb(proc.pid))
+                time.sleep(0.5)
+            elapsed = time.perf_counter() - start
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    latencies.sort()
+    return {
+        "mode": mode, "workers": workers, "users": users, "analyses": len(latencies), "errors": len(errors),
+        "elapsed_s": elapsed, "throughput_per_min": len(latencies) / elapsed * 60,
+        "p50_s": statistics.median(latencies) if latencies else None,
+        "p95_s": latencies[int(len(latencies) * 0.95) - 1] if latencies else None,
+        "idle_rss_mb": idle_mb, "peak_rss_mb": max(peak),
+        "error_samples": sorted(set(errors))[:3],
+    }
+
+
+# ---------- paid3: apel unic vs. fan-out ----------
+
+def latency_by_analysis(entries, tier="paid3"):
+    """Latenta per analiza din usage.jsonl: {"single": [...], "fanout": [...]}, in secunde.
+
+    Cererile fan-out ale unei analize au acelasi batch; analiza dureaza cat cea mai lunga.
+    """
+    single, batches = [], {}
+    for entry in entries:
+        if entry.get("tier") != tier or entry.get("latency_ms") is None:
+            continue
+        if entry.get("batch"):
+            batches.setdefault(entry["batch"], []).append(entry["latency_ms"])
+        else:
+            single.append(entry["latency_ms"])
+    return {"single": [ms / 1000 for ms in single],
+            "fanout": [max(parts) / 1000 for parts in batches.values()]}
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return None, None
+    return statistics.median(values), values[max(int(len(values) * 0.95) - 1, 0)]
+
+
+def print_latency_report(groups):
+    print(f"{'paid3':<10}{'analize':>9}{'p50 s':>9}{'p95 s':>9}")
+    for mode, values in groups.items():
+        p50, p95 = percentiles(values)
+        print(f"{mode:<10}{len(values):>9}{p50 or 0:>9.2f}{p95 or 0:>9.2f}")
+
+
+def run_fanout(runs, concurrency, stub_port):
+    """Ruleaza analize paid3 in proces, contra stub-ului, in ambele moduri; latenta din usage.jsonl."""
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{stub_port}/v1"
+    with tempfile.TemporaryDirectory() as workdir:
+        app.usage_file = os.path.join(workdir, "usage.jsonl")
+        texts = [benchmarks.make_speech(random.Random(i), words=700) for i in range(runs)]
+        for fanout in (False, True):
+            app.PAID3_FANOUT = fanout
+            queue = list(texts)
+            lock = threading.Lock()
+
+            def worker():
+                while True:
+                    with lock:
+                        if not queue:
+                            return
+                        text = queue.pop()
+                    result = app.analyze_speech_paid3(text, "fanout@example.ro")
+                    assert "analysis" in result and app.calculate_total_score(result)[1] == 100, result
+            threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        return latency_by_analysis(app.iter_usage())
+
+
+def print_report(rows):
+    print(f"{'deployment':<16}{'analize':>9}{'erori':>7}{'analize/min':>13}{'p50 s':>8}{'p95 s':>8}"
+          f"{'RSS idle MB':>13}{'RSS peak MB':>13}")
+    for r in rows:
+        label = f"{r['mode']} x{r['workers']}"
+        print(f"{label:<16}{r['analyses']:>9}{r['errors']:>7}{r['throughput_per_min']:>13.1f}"
+              f"{r['p50_s'] or 0:>8.2f}{r['p95_s'] or 0:>8.2f}{r['idle_rss_mb']:>13.0f}{r['peak_rss_mb']:>13.0f}")
+        for sample in r["error_samples"]:
+            print(f"    eroare: {sample}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("stub", "run", "compare", "fanout", "latency"))
+    parser.add_argument("--mode", choices=("sync", "async"), default="async")
+    parser.add_argument("--workers", type=int, default=1, help="workeri gunicorn pentru 'run'")
+    parser.add_argument("--sync-workers", default="3", help="workerii sync comparati, separati prin virgula")
+    parser.add_argument("--async-workers", type=int, default=1)
+    parser.add_argument("--users", type=int, default=50, help="speakeri concurenti")
+    parser.add_argument("--rounds", type=int, default=3, help="analize per speaker")
+    parser.add_argument("--tier", choices=benchmarks.TIER_NAMES, default="paid1")
+    parser.add_argument("--port", type=int, default=10100)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--runs", type=int, default=40, help="analize paid3 per mod, pentru 'fanout'")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--usage", default=app.usage_file, help="usage.jsonl pentru 'latency'")
+    parser.add_argument("--save", metavar="FILE", help="scrie rezultatele JSON in FILE")
+    args = parser.parse_args()
+
+    if args.command == "latency":
+        app.usage_file = args.usage
+        print_latency_report(latency_by_analysis(app.iter_usage()))
+        return
+
+    start_stub(args.stub_port)
+    if args.command == "stub":
+        print(f"OpenAI simulat pe http://127.0.0.1:{args.stub_port}/v1 (Ctrl+C pentru oprire)")
+        threading.Event().wait()
+    if args.command == "fanout":
+        print_latency_report(run_fanout(args.runs, args.concurrency, args.stub_port))
+        return
+    if args.command == "run":
+        plan = [(args.mode, args.workers)]
+    else:
+        plan = [("sync", int(w)) for w in args.sync_workers.split(",") if w] + [("async", args.async_workers)]
+    rows = [run_load(mode, workers, args.users, args.rounds, args.tier, args.port, args.stub_port)
+            for mode, workers in plan]
+    print_report(rows)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"meta": {"created": datetime.now().isoformat(), "tier": args.tier,
+                                "stub_base_latency": STUB_BASE_LATENCY,
+                                "stub_tokens_per_sec": STUB_TOKENS_PER_SEC}, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
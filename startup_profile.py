@@ -0,0 +1,91 @@
+"""Raport de pornire pentru app.py.
+
+    python startup_profile.py            # raport: timp de import la rece + top module
+    python startup_profile.py --check    # iese cu cod 1 daca importul depaseste tinta
+
+Fiecare masuratoare ruleaza intr-un proces Python nou, ca un worker gunicorn la boot.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+COLD_START_TARGET_MS = float(os.environ.get("COLD_START_TARGET_MS", 400))
+HEAVY_MODULES = ("openai", "matplotlib", "numpy", "fpdf")
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+TIMING_SNIPPET = """
+import sys, time
+sys.path.insert(0, {root!r})
+t = time.perf_counter()
+import app
+elapsed = (time.perf_counter() - t) * 1000
+loaded = [m for m in {heavy!r} if m in sys.modules]
+print(elapsed, ",".join(loaded))
+"""
+
+
+def run_python(args, env_extra=None):
+    env = dict(os.environ, OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "sk-startup-profile"))
+    env.update(env_extra or {})
+    return subprocess.run([sys.executable] + args, capture_output=True, text=True, env=env, cwd=ROOT, check=True)
+
+
+def measure_cold_import(runs):
+    timings, loaded = [], ""
+    for _ in range(runs):
+        out = run_python(["-c", TIMING_SNIPPET.format(root=ROOT, heavy=HEAVY_MODULES)]).stdout.split()
+        timings.append(float(out[0]))
+        loaded = out[1] if len(out) > 1 else ""
+    return timings, loaded
+
+
+def top_imports(limit):
+    """Parseaza iesirea -X importtime; returneaza [(cumulativ_us, modul)] pentru modulele de nivel 1."""
+    stderr = run_python(["-X", "importtime", "-c", "import app"]).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 1:
+            rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--check", action="store_true", help="esueaza daca mediana depaseste tinta")
+    parser.add_argument("--target-ms", type=float, default=COLD_START_TARGET_MS)
+    args = parser.parse_args()
+
+    timings, loaded = measure_cold_import(args.runs)
+    median = statistics.median(timings)
+    print(f"import app (rece, {args.runs} rulari): mediana {median:.0f} ms, min {min(timings):.0f} ms, max {max(timings):.0f} ms")
+    print(f"tinta cold start: {args.target_ms:.0f} ms")
+    print(f"module grele incarcate la import: {loaded or 'niciunul'}")
+    if not args.check:
+        print("\nCele mai costisitoare importuri (cumulativ):")
+        for cumulative, name in top_imports(args.top):
+            print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    if args.check:
+        problems = []
+        if median > args.target_ms:
+            problems.append(f"mediana {median:.0f} ms > tinta {args.target_ms:.0f} ms")
+        if loaded:
+            problems.append(f"module grele importate la pornire: {loaded}")
+        if problems:
+            print("ESEC: " + "; ".join(problems))
+            sys.exit(1)
+        print("OK")
+
+
+if __name__ == "__main__":
+    main()
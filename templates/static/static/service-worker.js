@@ -1,9 +1,8 @@
-const CACHE_NAME = 'speakerlab-v1';
-const STATIC_ASSETS = [
-  '/',
-  '/icon-192.png',
-  '/icon-512.png',
-];
+// Linia ASSET_MANIFEST este rescrisa la pornirea serverului cu URL-urile cu amprenta.
+const ASSET_MANIFEST = {"version": "dev", "assets": ["/icon-192.png", "/icon-512.png"]};
+const CACHE_NAME = 'speakerlab-' + ASSET_MANIFEST.version;
+const PAGES_CACHE = 'speakerlab-pages';
+const STATIC_ASSETS = ['/', ...ASSET_MANIFEST.assets];
 
 self.addEventListener('install', event => {
   event.waitUntil(
@@ -15,24 +14,43 @@ self.addEventListener('install', event => {
 self.addEventListener('activate', event => {
   event.waitUntil(
     caches.keys().then(keys =>
-      Promise.all(keys.filter(k => k !== CACHE_NAME).map(k => caches.delete(k)))
+      Promise.all(keys.filter(k => k !== CACHE_NAME && k !== PAGES_CACHE).map(k => caches.delete(k)))
     )
   );
   self.clients.claim();
 });
 
+function isHistoryPage(url) {
+  return url.pathname === '/history';
+}
+
 self.addEventListener('fetch', event => {
   if (event.request.method !== 'GET') return;
+  const url = new URL(event.request.url);
+  if (url.pathname === '/logout') {
+    // Istoricul salvat pentru offline apartine userului care iese.
+    event.waitUntil(caches.delete(PAGES_CACHE));
+  }
   if (event.request.headers.get('accept')?.includes('text/html')) {
+    // Network-first; ultima pagina de istoric vizitata ramane disponibila offline.
     event.respondWith(
-      fetch(event.request).catch(() => caches.match('/'))
+      fetch(event.request).then(response => {
+        if (response.ok && isHistoryPage(url)) {
+          const clone = response.clone();
+          caches.open(PAGES_CACHE).then(cache => cache.put('/history', clone));
+        }
+        return response;
+      }).catch(() =>
+        caches.match(isHistoryPage(url) ? '/history' : '/').then(cached => cached || caches.match('/'))
+      )
     );
     return;
   }
   event.respondWith(
     caches.match(event.request).then(cached => {
       return cached || fetch(event.request).then(response => {
-        if (response.ok) {
+        // Doar URL-urile cu amprenta sunt imuabile; restul trec mereu prin retea.
+        if (response.ok && url.pathname.startsWith('/assets/')) {
           const clone = response.clone();
           caches.open(CACHE_NAME).then(cache => cache.put(event.request, clone));
         }